@@ -1,5 +1,18 @@
-from django.apps import AppConfig
-
-
-class AppSwapPoolConfig(AppConfig):
-    name = 'app_Swap_Pool'
+from django.apps import AppConfig
+from django.db.models.signals import post_save, post_delete
+
+
+class AppSwapPoolConfig(AppConfig):
+    name = 'app_Swap_Pool'
+
+    def ready(self):
+        from app_Admin_Option.models import Option
+        from app_Currency.models import Currency
+        from app_Swap_Pool.models import Pool
+        from app_Swap_Pool.classes import FeeConfig, CurrencyCache, PoolGraph
+        post_save.connect(FeeConfig.invalidate, sender=Option, dispatch_uid='swap_fee_config_save') # admin changed an option, so cached fees are expired
+        post_delete.connect(FeeConfig.invalidate, sender=Option, dispatch_uid='swap_fee_config_delete')
+        post_save.connect(CurrencyCache.invalidate, sender=Currency, dispatch_uid='swap_currency_cache_save') # currency is changed, so cached serialized currencies are expired
+        post_delete.connect(CurrencyCache.invalidate, sender=Currency, dispatch_uid='swap_currency_cache_delete')
+        post_save.connect(PoolGraph.invalidate, sender=Pool, dispatch_uid='swap_pool_graph_save') # new pool is an edge of currencies graph
+        post_delete.connect(PoolGraph.invalidate, sender=Pool, dispatch_uid='swap_pool_graph_delete')
@@ -0,0 +1,309 @@
+import json
+import math
+import random
+import threading
+import time
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy
+import pytz
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from app_Currency.models import Currency
+from app_Swap_Pool.models import Pool
+from app_Swap_Pool.classes import PriceSnapshot, FeeConfig, HistoryRowRenderer, assert_query_budget
+from app_Swap_Providing.models import Provider, ProviderHistory
+from app_Swap_Swaping.models import SwapHistory
+
+
+class LocalCurrenciesPrice:
+    """
+    stand-in of CurrenciesPrice with fixed prices (no redis)
+    """
+    prices_irt = {'IRT': 1, 'USDT': 50000, 'BTC': 1500000000, 'ETH': 100000000}
+    default_price_irt = 100000 # price of other currencies based on IRT
+
+    def cal_value_in_irt(self, currency_symbol, amount):
+        return amount * self.prices_irt.get(currency_symbol, self.default_price_irt)
+
+    def cal_value_in_usdt(self, currency_symbol, amount):
+        return self.cal_value_in_irt(currency_symbol, amount) / self.prices_irt['USDT']
+
+    def cal_value_in_btc(self, currency_symbol, amount):
+        return self.cal_value_in_irt(currency_symbol, amount) / self.prices_irt['BTC']
+
+
+class LocalWallet:
+    """
+    stand-in of Wallet in memory, only methods that swap and providing use
+    """
+    def __init__(self, currency_symbol, available):
+        self.available = available
+        self.excurrency = SimpleNamespace(currency=SimpleNamespace(symbol=currency_symbol, name_fa=currency_symbol))
+
+    def check_available_balance(self, amount):
+        return self.available >= amount
+
+    def low_balance(self, amount):
+        self.available -= amount
+
+    def add_balance(self, amount, add_net=True):
+        self.available += amount
+
+
+class LocalWalletManager:
+    """
+    stand-in of Wallet.objects, every user has balance in every currency
+    """
+    def __init__(self, balance):
+        self.balance = balance
+        self.wallets = {}
+        self.lock = threading.Lock()
+
+    def find_by_currency_symbol_and_merge_to_last(self, user, currency_symbol):
+        with self.lock:
+            return self.wallets.setdefault((user.id, currency_symbol), LocalWallet(currency_symbol, self.balance))
+
+
+class AMMBenchmark:
+    """
+    reproducible benchmark of swap hot paths (pool calculating, prices, swap, providing, reports and history endpoints)
+    it should run on an empty database (benchmarkamm command creates test database), CurrenciesPrice, Wallet, JWT authentication and permissions are replaced by local stand-ins
+    """
+    def __init__(self, pools=10, providers=100, swaps=10000, iterations=50, warmup=5, threads=4, seed=1, check_budgets=False):
+        """
+        :params pools: number of seeded pools
+        :params providers: number of seeded providers (users)
+        :params swaps: number of seeded swaps (spread in last 30 days)
+        :params iterations: measured calls of every benchmark
+        :params warmup: not measured calls before measuring
+        :params threads: number of threads in concurrent swap benchmark
+        :params seed: seed of random generator, same seed makes same data
+        :params check_budgets: if it's True, every request fails when its view executes more queries than its query_budget
+        """
+        self.pools_count = pools
+        self.providers_count = providers
+        self.swaps_count = swaps
+        self.iterations = iterations
+        self.warmup = warmup
+        self.threads = threads
+        self.seed = seed
+        self.check_budgets = check_budgets
+        self.random = random.Random(seed)
+        self.factory = APIRequestFactory()
+        self.fees = FeeConfig(0.003, 0.0025) # total fee and providers fee of swaps
+
+    def config(self):
+        return {'pools': self.pools_count, 'providers': self.providers_count, 'swaps': self.swaps_count, 'iterations': self.iterations, 'threads': self.threads, 'seed': self.seed, 'engine': connection.vendor}
+
+    def stand_ins(self):
+        """
+        :return: ExitStack that replaces CurrenciesPrice, Wallet, JWT authentication and swap fees until it's closed
+        """
+        stack = ExitStack()
+        wallet = SimpleNamespace(objects=LocalWalletManager(balance=10 ** 12))
+        for target in ('app_Swap_Pool.classes.CurrenciesPrice', 'app_Swap_Pool.models.CurrenciesPrice', 'app_Swap_Providing.serializers.CurrenciesPrice'):
+            stack.enter_context(mock.patch(target, LocalCurrenciesPrice))
+        for target in ('app_Swap_Swaping.serializers.Wallet', 'app_Swap_Swaping.classes.Wallet', 'app_Swap_Providing.serializers.Wallet'):
+            stack.enter_context(mock.patch(target, wallet))
+        stack.enter_context(mock.patch('rest_framework_simplejwt.authentication.JWTAuthentication.authenticate', lambda authenticator, request: (self.user, None)))
+        stack.enter_context(mock.patch.object(FeeConfig, 'current', classmethod(lambda cls: self.fees)))
+        return stack
+
+    def seed_data(self):
+        """
+        create currencies, pools, providers (with their histories) and swaps
+        """
+        User = get_user_model()
+        symbols = ['IRT', 'USDT', 'BTC', 'ETH'] + [f'C{index}' for index in range(max(self.pools_count - 2, 0))]
+        currencies = {symbol: Currency.objects.create(symbol=symbol, name_fa=symbol, name_en=symbol) for symbol in symbols}
+        self.pools = []
+        for index in range(self.pools_count):
+            currency_A = currencies[symbols[index + 2]]
+            currency_B = currencies['IRT' if index % 2 == 0 else 'USDT'] # half of pools are based on IRT and half on USDT
+            price = LocalCurrenciesPrice().cal_value_in_irt(currency_A.symbol, 1) / LocalCurrenciesPrice().cal_value_in_irt(currency_B.symbol, 1)
+            amount_A = 1000 * (1 + self.random.random())
+            self.pools.append(Pool.objects.create(currency_A=currency_A, currency_B=currency_B, amount_A=amount_A, amount_B=amount_A * price, lp_tokens=0, rank=index + 1))
+
+        self.users = [User.objects.create(**{User.USERNAME_FIELD: f'benchmark_user_{index}'}) for index in range(max(self.providers_count, 1))]
+        self.user = self.users[0] # user of requests, it provides in all pools
+        price_snapshot = PriceSnapshot()
+        providing = [(self.user, pool) for pool in self.pools] + [(user, self.pools[index % len(self.pools)]) for index, user in enumerate(self.users[1:])]
+        for user, pool in providing:
+            pool.refresh_from_db()
+            amount_A = pool.amount_A * 0.01
+            amount_B = pool.amount_B * 0.01
+            provider = Provider.objects.create_new_provider(user, pool, amount_A, amount_B)
+            ProviderHistory.objects.create_new_tx(provider, 'add', amount_A, amount_B, provider.lp_tokens, provider.pool.lp_tokens, price_snapshot=price_snapshot)
+
+        now = datetime.now(tz=pytz.utc)
+        price_snapshot = PriceSnapshot()
+        pools = list(Pool.objects.select_related('currency_A', 'currency_B'))
+        swaps = []
+        for index in range(self.swaps_count):
+            pool = self.random.choice(pools)
+            is_reverse = self.random.random() < 0.5
+            input_amount = (pool.amount_B if is_reverse else pool.amount_A) * 0.001 * self.random.random()
+            pre_swaping = pool.swaping(input_amount, is_reverse=is_reverse, fees=self.fees)
+            swap = SwapHistory.objects.build_new_swap(
+                self.random.choice(self.users), pool,
+                pool.currency_B if is_reverse else pool.currency_A, pool.currency_A if is_reverse else pool.currency_B,
+                input_amount, pre_swaping['output_amount'], pre_swaping['fee_amount'], pool.cal_price(is_reverse=is_reverse), pre_swaping['final_price'], pre_swaping['slippage_tolerance'],
+                price_snapshot=price_snapshot, fee_percentage=self.fees.total_fee
+            )
+            swap.time = now - timedelta(seconds=self.random.random() * 30 * 24 * 3600)
+            swaps.append(swap)
+            if len(swaps) == 1000 or index == self.swaps_count - 1:
+                with transaction.atomic():
+                    SwapHistory.objects.bulk_create_new_swaps(swaps, price_snapshot=price_snapshot)
+                swaps = []
+
+    def request(self, view, method, data=None):
+        """
+        :return: response of this view for this request (permissions are skipped, user is forced)
+        if check_budgets is True, AssertionError is raised when view executes more queries than its query_budget
+        """
+        request = getattr(self.factory, method)('/', data, format='json') if method != 'get' else self.factory.get('/', data)
+        force_authenticate(request, user=self.user)
+        response = view(request)
+        if hasattr(response, 'render'):
+            response.render()
+        if self.check_budgets:
+            assert_query_budget(response)
+        return response
+
+    def measure(self, function):
+        """
+        :return: latency percentiles (milliseconds) and number of queries of calling this function
+        """
+        for _ in range(self.warmup):
+            function()
+        durations = []
+        queries = []
+        for _ in range(self.iterations):
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                function()
+                durations.append((time.perf_counter() - start) * 1000)
+            queries.append(len(context.captured_queries))
+        return {
+            'p50': float(numpy.percentile(durations, 50)),
+            'p90': float(numpy.percentile(durations, 90)),
+            'p99': float(numpy.percentile(durations, 99)),
+            'max': max(durations),
+            'queries': float(numpy.mean(queries)),
+            'max_queries': max(queries),
+        }
+
+    def measure_concurrent_swaps(self):
+        """
+        every thread swaps on first pool (through SwapingView) for iterations times
+        :return: swaps/sec of this pool and number of failed swaps
+        """
+        from app_Swap_Swaping.views import SwapingView
+        view = SwapingView.as_view(permission_classes=[])
+        pool = self.pools[0]
+        failed = []
+
+        def swaping():
+            try:
+                for _ in range(self.iterations):
+                    response = self.request(view, 'post', {'input_currency_symbol': pool.currency_A.symbol, 'output_currency_symbol': pool.currency_B.symbol, 'input_amount': pool.amount_A * 0.0001, 'max_slippage_tolerance': 100})
+                    if response.status_code != 201:
+                        failed.append(response.status_code)
+            except Exception as e: # database is locked and etc
+                failed.append(str(e))
+            finally:
+                connection.close() # every thread has its own connection
+
+        threads = [threading.Thread(target=swaping) for _ in range(self.threads)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duration = time.perf_counter() - start
+        done = self.threads * self.iterations - len(failed)
+        return {'swaps_per_sec': done / duration if duration else 0, 'failed': len(failed)}
+
+    def benchmarks(self):
+        """
+        :return: {benchmark name: function}
+        """
+        from app_Swap_Pool.serializers import HomeSerializers
+        from app_Swap_Pool.views import PoolsDetailView
+        from app_Swap_Swaping.views import SwapingView, SwapHistoryView
+        from app_Swap_Providing.views import ProvidingView, ProviderHistoryView
+        swaping_view = SwapingView.as_view(permission_classes=[])
+        providing_view = ProvidingView.as_view(permission_classes=[])
+        pool = self.pools[0]
+        symbol_A, symbol_B = pool.currency_A.symbol, pool.currency_B.symbol
+        swap_rows = list(SwapHistory.objects.find_by_user_pool_last(user=None, pool=None).values(*HistoryRowRenderer.swap_values)[:1000])
+
+        def providing_add():
+            pool.refresh_from_db()
+            amount_A = pool.amount_A * 0.0001
+            return self.request(providing_view, 'post', {'currency_A_symbol': symbol_A, 'currency_B_symbol': symbol_B, 'amount_A': amount_A, 'amount_B': pool.cal_price() * amount_A})
+
+        return {
+            'pool.swaping': lambda: pool.swaping(pool.amount_A * 0.001, is_reverse=False),
+            'pool_manager.cal_price': lambda: Pool.objects.cal_price(symbol_A, 'USDT'),
+            'price_snapshot.cal_price': lambda: PriceSnapshot().cal_price(symbol_A, 'USDT'),
+            'swap.get': lambda: self.request(swaping_view, 'get', {'input_currency_symbol': symbol_A, 'output_currency_symbol': symbol_B, 'input_amount': pool.amount_A * 0.0001}),
+            'swap.post': lambda: self.request(swaping_view, 'post', {'input_currency_symbol': symbol_A, 'output_currency_symbol': symbol_B, 'input_amount': pool.amount_A * 0.0001, 'max_slippage_tolerance': 100}),
+            'providing.add': providing_add,
+            'providing.remove': lambda: self.request(providing_view, 'put', {'currency_A_symbol': symbol_A, 'currency_B_symbol': symbol_B, 'remove_percent': 0.001}),
+            'swap_history.cal_total_received_fees': lambda: SwapHistory.objects.cal_total_received_fees_currency_in_all_pools(currency_symbol=symbol_B, base_currency='IRT', price_snapshot=PriceSnapshot()),
+            'home_serializers': lambda: HomeSerializers({}, many=False, context={'price_snapshot': PriceSnapshot()}).data,
+            'pools_detail': lambda: self.request(PoolsDetailView.as_view(permission_classes=[]), 'get'),
+            'swap_history.page': lambda: self.request(SwapHistoryView.as_view(permission_classes=[]), 'get', {'limit': 100}),
+            'provider_history.page': lambda: self.request(ProviderHistoryView.as_view(permission_classes=[]), 'get', {'limit': 100}),
+            'history_renderer.1000_rows': lambda: HistoryRowRenderer().render_swaps(swap_rows),
+        }
+
+    def run(self, only=None):
+        """
+        :params only: list of benchmark names (all benchmarks if it's None)
+        :return: {'config': ..., 'results': {benchmark name: result}}
+        """
+        with self.stand_ins():
+            self.seed_data()
+            results = {}
+            for name, function in self.benchmarks().items():
+                if only and name not in only:
+                    continue
+                results[name] = self.measure(function)
+            if not only or 'swap.concurrent' in only:
+                results['swap.concurrent'] = self.measure_concurrent_swaps()
+        return {'config': self.config(), 'results': results}
+
+    @staticmethod
+    def compare(report, baseline, threshold=0.2):
+        """
+        :params threshold: a benchmark is slower if its p50 is more than (1 + threshold) times of baseline p50
+        :return: list of (benchmark name, baseline p50, current p50, ratio, baseline queries, current queries, regression)
+        """
+        rows = []
+        for name, result in report['results'].items():
+            base = baseline['results'].get(name)
+            if base is None or 'p50' not in result:
+                continue
+            ratio = result['p50'] / base['p50'] if base['p50'] else math.inf
+            rows.append((name, base['p50'], result['p50'], ratio, base['queries'], result['queries'], ratio > 1 + threshold or result['queries'] > base['queries']))
+        return rows
+
+    @staticmethod
+    def save(report, path):
+        with open(path, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    @staticmethod
+    def load(path):
+        with open(path) as file:
+            return json.load(file)
@@ -0,0 +1,646 @@
+import base64
+import copy
+import functools
+import heapq
+import math
+import time
+from collections import Counter
+from datetime import datetime
+import pytz
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from khayyam import JalaliDate
+
+from app_Admin_Option.models import Option
+from app_Swap_Pool.models import Pool
+from app_Swap_Pool.metrics import timed
+from app_Utils.classes import CurrenciesPrice
+from app_Utils.functions import TehranTimezone
+
+
+class PriceSnapshot:
+    """
+    load reserves of all pools once and calculating prices from memory
+    build it once per request (or celery task) and pass it to price calculating methods
+    currencies are nodes and pools are edges of a graph, so we can find price of a currency through other pools too
+    """
+    def __init__(self, pools=None):
+        """
+        :params pools: pools that prices calculating based on them (if it's None, we load all pools on first use)
+        """
+        self._pools = None if pools is None else {pool.id: pool for pool in pools}
+        self._graph = None
+        self._prices = {} # calculated prices, key is (currency_symbol, base_currency_symbol)
+        self._currencies_price_class = None
+
+    @property
+    def pools(self):
+        """
+        :return: dict of all pools (key is pool id)
+        """
+        if self._pools is None:
+            self._pools = {pool.id: pool for pool in Pool.objects.select_related('currency_A', 'currency_B').all()}
+        return self._pools
+
+    @property
+    def graph(self):
+        """
+        :return: currencies graph, {currency_symbol: {neighbour_currency_symbol: [pool_id, ...]}}
+        """
+        if self._graph is None:
+            self._graph = {}
+            for pool in self.pools.values():
+                self._add_edge(pool)
+        return self._graph
+
+    def _add_edge(self, pool):
+        for symbol, neighbour_symbol in ((pool.currency_A.symbol, pool.currency_B.symbol), (pool.currency_B.symbol, pool.currency_A.symbol)):
+            pools_id = self._graph.setdefault(symbol, {}).setdefault(neighbour_symbol, [])
+            if pool.id not in pools_id:
+                pools_id.append(pool.id)
+
+    def update_pool(self, pool):
+        """
+        :params pool: pool object that its reserves changed (after swap or providing)
+        we only replace this pool in graph (edges weights are read from pools reserves) and forget calculated prices
+        """
+        if self._pools is not None:
+            self._pools[pool.id] = pool
+            if self._graph is not None:
+                self._add_edge(pool) # new pool
+        self._prices = {}
+
+    def filter_by_currency(self, currency_symbol):
+        """
+        :params currency_symbol: one side currency symbol
+        :return: all pools that this currency is in one side of them
+        """
+        return [pool for pool in self.pools.values() if currency_symbol in (pool.currency_A.symbol, pool.currency_B.symbol)]
+
+    def cal_depth(self, pool, currency_symbol, rate):
+        """
+        :params currency_symbol: side of pool that path enters from
+        :params rate: amount of currency_symbol per one start currency of path (product of prices of previous pools)
+        :return: liquidity depth of this pool based on start currency of path (value of currency_symbol reserve), it's 0 for empty pools
+        depths of all pools are in one unit, so pools of different pairs can be compared
+        """
+        if pool.amount_A <= 0 or pool.amount_B <= 0 or rate <= 0:
+            return 0
+        return (pool.amount_A if pool.currency_A.symbol == currency_symbol else pool.amount_B) / rate
+
+    def find_deepest_path(self, currency_symbol, base_currency_symbol):
+        """
+        :params currency_symbol: start currency symbol
+        :params base_currency_symbol: end currency symbol
+        :return: list of (pool, is_reverse) that its smallest pool depth (based on start currency) is maximum (fewer hops for same depth), None if there is no path
+        """
+        if currency_symbol not in self.graph or base_currency_symbol not in self.graph:
+            return None
+        best = {currency_symbol: (math.inf, 0)} # best (depth, hops) that we reached every currency
+        queue = [(-math.inf, 0, 0, currency_symbol, 1, [])] # (-depth, hops, push order, currency symbol, rate of currency based on start currency, path)
+        pushed = 0
+        while queue:
+            depth, hops, _, symbol, rate, path = heapq.heappop(queue)
+            depth = -depth
+            if symbol == base_currency_symbol:
+                return path
+            if best.get(symbol, (0, 0)) != (depth, hops): # we already reached this currency with a better path
+                continue
+            for neighbour_symbol, pools_id in self.graph[symbol].items():
+                pool = max((self.pools[pool_id] for pool_id in pools_id), key=lambda pool: self.cal_depth(pool, symbol, rate)) # deepest pool between this two currencies
+                edge_depth = min(depth, self.cal_depth(pool, symbol, rate))
+                if edge_depth <= 0:
+                    continue
+                best_depth, best_hops = best.get(neighbour_symbol, (0, 0))
+                if edge_depth > best_depth or (edge_depth == best_depth and hops + 1 < best_hops):
+                    is_reverse = pool.currency_A.symbol != symbol
+                    best[neighbour_symbol] = (edge_depth, hops + 1)
+                    pushed += 1
+                    heapq.heappush(queue, (-edge_depth, hops + 1, pushed, neighbour_symbol, rate * pool.cal_price(is_reverse=is_reverse), path + [(pool, is_reverse)]))
+        return None
+
+    def cal_price_by_path(self, currency_symbol, base_currency_symbol):
+        """
+        :return: currency_symbol price based on base_currency_symbol through the deepest path of pools, -1 if there is no path
+        """
+        path = self.find_deepest_path(currency_symbol, base_currency_symbol)
+        if not path:
+            return -1
+        price = 1
+        for pool, is_reverse in path:
+            price *= pool.cal_price(is_reverse=is_reverse)
+        return price
+
+    def price_table(self, base_currencies_symbol):
+        """
+        :params base_currencies_symbol: list of base currencies symbol
+        :return: price of every currency of pools based on every base currency, {currency_symbol: {base_currency_symbol: price}}
+        """
+        return {currency_symbol: {base_currency_symbol: self.cal_price(currency_symbol, base_currency_symbol) for base_currency_symbol in base_currencies_symbol} for currency_symbol in self.graph}
+
+    @timed('price_snapshot.cal_price')
+    def cal_price(self, currency_symbol, base_currency_symbol):
+        """
+        :params currency_symbol: currency symbol that i want it price
+        :params base_currency_symbol: currency symbol that i want calculating price based on it (any currency in pools)
+        :return: currency_symbol price based on base_currency_symbol
+        """
+        key = (currency_symbol, base_currency_symbol)
+        if key not in self._prices:
+            self._prices[key] = self._cal_price(currency_symbol, base_currency_symbol)
+        return self._prices[key]
+
+    def _cal_price(self, currency_symbol, base_currency_symbol):
+        if currency_symbol == base_currency_symbol:
+            return 1
+        for pool in self.filter_by_currency(base_currency_symbol): # search in base currency pools for find currency_symbol in other side
+            if pool.currency_A.symbol == currency_symbol: # currency_A is currency_symbol
+                price = pool.cal_price(is_reverse=False) # we shouldn't reverse that
+                if price > 0:
+                    return price
+            elif pool.currency_B.symbol == currency_symbol: # currency_B is currency_symbol
+                price = pool.cal_price(is_reverse=True) # we should reverse that
+                if price > 0:
+                    return price
+        price = self.cal_price_by_path(currency_symbol, base_currency_symbol) # there is no direct pool, so we search other pools
+        if price > 0 or base_currency_symbol not in ('IRT', 'USDT', 'BTC'):
+            return price
+        # there is no path with this currency and we received price from our redis price list
+        if self._currencies_price_class is None:
+            self._currencies_price_class = CurrenciesPrice()
+        if base_currency_symbol == 'IRT':
+            return self._currencies_price_class.cal_value_in_irt(currency_symbol, 1)
+        elif base_currency_symbol == 'USDT':
+            return self._currencies_price_class.cal_value_in_usdt(currency_symbol, 1)
+        else:
+            return self._currencies_price_class.cal_value_in_btc(currency_symbol, 1)
+
+
+class VersionedCache:
+    """
+    base of values cached in process (subclasses implement load_value and set version_key and check_interval_setting)
+    invalidate (receiver of model signals connected in AppSwapPoolConfig.ready) increases a version in shared cache, then all processes reload value
+    cached value is replaced (never cleared or changed), so threads can use the value that they got from load()
+    """
+    version_key = None
+    check_interval_setting = None # name of setting, version is checked at most once per this seconds (default is 1)
+    _value = None # cached value of this process
+    _version = None # version of cached value
+    _checked_at = 0 # last time that we checked version
+
+    @classmethod
+    def load_value(cls):
+        raise NotImplementedError
+
+    @classmethod
+    def load(cls, reload=False):
+        """
+        load value if cache of this process is empty or expired (or reload is True)
+        :return: cached value
+        """
+        value = cls._value
+        now = time.time()
+        if value is None or reload or now - cls._checked_at >= getattr(settings, cls.check_interval_setting, 1):
+            version = cache.get(cls.version_key) # we read version before value, so we never cache old value with new version
+            if value is None or reload or version != cls._version:
+                value = cls._value = cls.load_value()
+                cls._version = version
+            cls._checked_at = now
+        return value
+
+    @classmethod
+    def invalidate(cls, **kwargs):
+        """
+        cached values of all processes are expired
+        """
+        try:
+            cache.incr(cls.version_key)
+        except ValueError: # there is no version yet
+            cache.set(cls.version_key, 1, timeout=None)
+        cls._checked_at = 0 # this process checks version on next use
+
+
+class FeeConfig(VersionedCache):
+    """
+    swap fee options (swap_fee and swap_providers_fee) cached in process, reloaded when an Option is saved or deleted
+    """
+    version_key = 'swap_fee_config_version'
+    check_interval_setting = 'SWAP_FEE_CONFIG_CHECK_INTERVAL'
+
+    def __init__(self, total_fee, providers_fee):
+        """
+        :params total_fee: all fee that we received per swap
+        :params providers_fee: all providers fee that we received per swap
+        """
+        self.total_fee = total_fee
+        self.providers_fee = providers_fee
+
+    @classmethod
+    def load_value(cls):
+        return cls(
+            float(Option.objects.find_by_code_name('swap_fee').value),
+            float(Option.objects.find_by_code_name('swap_providers_fee').value)
+        )
+
+    @classmethod
+    def current(cls):
+        """
+        :return: FeeConfig object of current fees, pass it through a whole swap so all steps use same fees
+        """
+        return cls.load()
+
+
+class PoolGraph(VersionedCache):
+    """
+    pools with their currencies (edges of currencies graph) cached in process, for calculating prices without a PriceSnapshot of request
+    only creating or deleting a pool changes graph, reserves are changed by every swap, so they are read on every use with one query without joins
+    """
+    version_key = 'swap_pool_graph_version'
+    check_interval_setting = 'POOL_GRAPH_CHECK_INTERVAL'
+
+    @classmethod
+    def load_value(cls):
+        """
+        :return: {pool_id: pool object}
+        """
+        return {pool.id: pool for pool in Pool.objects.select_related('currency_A', 'currency_B').all()}
+
+    @classmethod
+    def snapshot(cls):
+        """
+        :return: PriceSnapshot of all pools with their current reserves
+        """
+        cached_pools = cls.load()
+        pools = []
+        for pool_id, amount_A, amount_B in Pool.objects.values_list('id', 'amount_A', 'amount_B'):
+            pool = cached_pools.get(pool_id)
+            if pool is None: # pool is created after loading and its signal is not received yet
+                continue
+            pool = copy.copy(pool) # cached pools are shared between threads, so reserves are set on a copy
+            pool.amount_A, pool.amount_B = amount_A, amount_B
+            pools.append(pool)
+        return PriceSnapshot(pools)
+
+    @classmethod
+    def invalidate(cls, created=True, **kwargs):
+        """
+        receiver of Pool post_save and post_delete signals, graph is expired only when a pool is created or deleted
+        """
+        if not created: # reserves are changed, they are read on every use
+            return
+        super().invalidate(**kwargs)
+
+
+class CurrencyCache(VersionedCache):
+    """
+    serialized currencies (CurrencySerializer data) cached in process by id and symbol, so embedding a currency needs no query
+    reloaded when a Currency is saved or deleted
+    """
+    version_key = 'swap_currency_cache_version'
+    check_interval_setting = 'CURRENCY_CACHE_CHECK_INTERVAL'
+
+    @classmethod
+    def load_value(cls):
+        """
+        :return: (by_id, by_symbol), {currency_id: serialized currency} and {currency_symbol: serialized currency}
+        """
+        from app_Currency.models import Currency
+        from app_Swap_Pool.serializers import CurrencySerializer
+        by_id, by_symbol = {}, {}
+        for currency in Currency.objects.all():
+            by_id[currency.id] = by_symbol[currency.symbol] = CurrencySerializer.serialize(currency)
+        return by_id, by_symbol
+
+    @classmethod
+    def render(cls, serialized_currency, request=None):
+        """
+        :params request: if it's not None, logoimage url is absolute (same as ImageField of serializers)
+        :return: copy of this serialized currency for response
+        """
+        if serialized_currency is None:
+            return None
+        serialized_currency = dict(serialized_currency)
+        if request is not None and serialized_currency.get('logoimage'):
+            serialized_currency['logoimage'] = request.build_absolute_uri(serialized_currency['logoimage'])
+        return serialized_currency
+
+    @classmethod
+    def get_by_id(cls, currency_id, request=None):
+        """
+        :return: serialized currency of this id, None if there is no currency
+        """
+        by_id, by_symbol = cls.load()
+        if currency_id not in by_id: # maybe currency is created after loading
+            by_id, by_symbol = cls.load(reload=True)
+        return cls.render(by_id.get(currency_id), request)
+
+    @classmethod
+    def get_by_symbol(cls, currency_symbol, request=None):
+        """
+        :return: serialized currency of this symbol, None if there is no currency
+        """
+        by_id, by_symbol = cls.load()
+        if currency_symbol not in by_symbol: # maybe currency is created after loading
+            by_id, by_symbol = cls.load(reload=True)
+        return cls.render(by_symbol.get(currency_symbol), request)
+
+
+class HomeSnapshot:
+    """
+    home page report is same for all users, so we calculating it in celery (RefreshHomeSnapshot task) and serve it from cache
+    if cached report is older than max_age, only one request calculates it again and other requests serve the old report meanwhile
+    if there is no cached report, a placeholder is served and report is calculated in celery
+    """
+    cache_key = 'swap_pool_home_snapshot'
+    lock_key = 'swap_pool_home_snapshot_lock'
+
+    def __init__(self, max_age=None, lock_timeout=None):
+        """
+        :params max_age: maximum age of cached report in seconds (default is HOME_SNAPSHOT_MAX_AGE setting or 60)
+        :params lock_timeout: maximum time in seconds that a request can hold refresh lock (default is HOME_SNAPSHOT_LOCK_TIMEOUT setting or 30)
+        """
+        self.max_age = getattr(settings, 'HOME_SNAPSHOT_MAX_AGE', 60) if max_age is None else max_age
+        self.lock_timeout = getattr(settings, 'HOME_SNAPSHOT_LOCK_TIMEOUT', 30) if lock_timeout is None else lock_timeout
+
+    @timed('home.refresh')
+    def refresh(self):
+        """
+        calculating home report and save it in cache
+        :return: home report
+        """
+        from app_Swap_Pool.serializers import HomeSerializers
+        report = HomeSerializers({}, many=False, context={'price_snapshot': PriceSnapshot()}).data
+        cache.set(self.cache_key, {'time': time.time(), 'report': dict(report)}, timeout=None)
+        return dict(report)
+
+    def placeholder(self):
+        """
+        :return: home report with empty values (until first report is calculated), it needs no query
+        """
+        from app_Swap_Pool.serializers import HomeSerializers
+        return {field: None for field in HomeSerializers().fields}
+
+    def is_fresh(self, snapshot):
+        return snapshot is not None and time.time() - snapshot['time'] <= self.max_age
+
+    def get(self):
+        """
+        :return: home report from cache (we calculating it if it's older than max_age)
+        if there is no report yet, we serve placeholder and RefreshHomeSnapshot task calculates it, so requests never wait for it
+        """
+        snapshot = cache.get(self.cache_key)
+        if self.is_fresh(snapshot):
+            return snapshot['report']
+        if not cache.add(self.lock_key, True, timeout=self.lock_timeout): # another request is calculating report
+            return self.placeholder() if snapshot is None else snapshot['report'] # serve old report until new one is ready
+        snapshot = cache.get(self.cache_key)
+        if self.is_fresh(snapshot): # another request refreshed it while we were acquiring lock
+            cache.delete(self.lock_key)
+            return snapshot['report']
+        if snapshot is None: # cold cache, lock is released by its timeout (task calculates report once meanwhile)
+            from app_Swap_Pool.tasks import RefreshHomeSnapshot # avoid circular import
+            RefreshHomeSnapshot.delay()
+            return self.placeholder()
+        try:
+            return self.refresh()
+        finally:
+            cache.delete(self.lock_key)
+
+
+class HistoryPagination(PageNumberPagination):
+    """
+    page number pagination for history lists (ordered by time) with two faster modes:
+    ?cursor=<cursor> (first page is ?pagination=cursor): keyset pagination on (time, id), without OFFSET and COUNT(*)
+    ?count=estimated: page number pagination without COUNT(*), count is null and next page is found by fetching one more row
+    """
+    page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        if self.cursor_query_param in request.query_params or request.query_params.get('pagination') == 'cursor':
+            self.mode = 'cursor'
+        elif request.query_params.get('count') == 'estimated':
+            self.mode = 'estimated'
+        else:
+            self.mode = 'page'
+            return super().paginate_queryset(queryset, request, view)
+
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        if self.mode == 'cursor':
+            queryset = queryset.order_by('-time', '-id')
+            cursor = self.decode_cursor(request)
+            if cursor is not None: # rows after last row of previous page
+                queryset = queryset.filter(Q(time__lt=cursor[0]) | Q(time=cursor[0], id__lt=cursor[1]))
+            rows = list(queryset[:self.page_size + 1])
+        else:
+            try:
+                self.page_number = max(int(request.query_params.get(self.page_query_param, 1)), 1)
+            except ValueError:
+                self.page_number = 1
+            offset = (self.page_number - 1) * self.page_size
+            rows = list(queryset[offset:offset + self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.rows = rows[:self.page_size]
+        return self.rows
+
+    def encode_cursor(self, row):
+        """
+        :return: cursor of this row, (time, id) in base64
+        """
+        time, id = (row['time'], row['id']) if isinstance(row, dict) else (row.time, row.id) # rows can be .values() rows too
+        return base64.urlsafe_b64encode(f'{time.isoformat()}|{id}'.encode()).decode()
+
+    def decode_cursor(self, request):
+        """
+        :return: (time, id) of cursor in query params, None for first page
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            time_part, id_part = base64.urlsafe_b64decode(encoded.encode()).decode().split('|')
+            return datetime.fromisoformat(time_part), int(id_part)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if self.mode == 'page':
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.mode == 'cursor':
+            return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.rows[-1]))
+        return replace_query_param(url, self.page_query_param, self.page_number + 1)
+
+    def get_previous_link(self):
+        if self.mode == 'page':
+            return super().get_previous_link()
+        if self.mode == 'cursor' or self.page_number == 1: # cursor pages only go forward
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page_number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.page_number - 1)
+
+    def get_paginated_response(self, data):
+        if self.mode == 'page':
+            return super().get_paginated_response(data)
+        return Response({
+            'count': None,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data
+        })
+
+
+@functools.lru_cache(maxsize=4096)
+def jalali_date(date):
+    """
+    :return: jalali date of this (gregorian) date, every date is converted once per process
+    """
+    return JalaliDate(date).isoformat()
+
+
+class HistoryRowRenderer:
+    """
+    fast rendering of swap and provider history rows for list endpoints (same output as SwapingSerializers and ProviderHistorySerializers)
+    rows are read with .values(), times are converted with cached jalali dates and every currency is serialized once
+    """
+    swap_values = ('id', 'input_currency_id', 'output_currency_id', 'output_amount', 'fee_amount', 'fee_percentage', 'before_price', 'after_price', 'slippage_tolerance', 'equivalent_irt', 'equivalent_usdt', 'equivalent_btc', 'time', 'input_amount')
+    provider_history_values = ('id', 'provider__user_id', 'type', 'amount_A', 'amount_B', 'equivalent_irt', 'equivalent_usdt', 'equivalent_btc', 'time')
+
+    def __init__(self, request=None):
+        self.request = request
+        self.now = datetime.now(tz=pytz.utc)
+        self.tehran_timezone = TehranTimezone()
+
+    def render_time(self, time):
+        """
+        :return: [jalali date, hour:minute] of this time in tehran timezone
+        """
+        local_time = time.astimezone(tz=self.tehran_timezone)
+        return [jalali_date(local_time.date()), f"{local_time.hour:02d}:{local_time.minute:02d}"]
+
+    def serialize_currencies(self, currencies_id):
+        """
+        :return: serialized currencies with these ids from CurrencyCache, {currency_id: serialized currency}
+        """
+        return {currency_id: CurrencyCache.get_by_id(currency_id, self.request) for currency_id in set(currencies_id)}
+
+    def render_swaps(self, rows):
+        """
+        :params rows: SwapHistory rows with swap_values fields
+        """
+        currencies = self.serialize_currencies([row['input_currency_id'] for row in rows] + [row['output_currency_id'] for row in rows])
+        return [{
+            'input_currency': currencies.get(row['input_currency_id']),
+            'output_currency': currencies.get(row['output_currency_id']),
+            'output_amount': row['output_amount'],
+            'fee_amount': row['fee_amount'],
+            'fee_percentage': row['fee_percentage'],
+            'before_price': row['before_price'],
+            'after_price': row['after_price'],
+            'slippage_tolerance': row['slippage_tolerance'],
+            'equivalent_irt': row['equivalent_irt'],
+            'equivalent_usdt': row['equivalent_usdt'],
+            'equivalent_btc': row['equivalent_btc'],
+            'time': self.render_time(row['time']) + [divmod((self.now - row['time']).total_seconds(), 60)[0]],
+            'input_amount': row['input_amount'],
+        } for row in rows]
+
+    def render_provider_histories(self, rows):
+        """
+        :params rows: ProviderHistory rows with provider_history_values fields
+        """
+        return [{
+            'user_id': row['provider__user_id'],
+            'type': row['type'],
+            'amount_A': row['amount_A'],
+            'amount_B': row['amount_B'],
+            'equivalent_irt': row['equivalent_irt'],
+            'equivalent_usdt': row['equivalent_usdt'],
+            'equivalent_btc': row['equivalent_btc'],
+            'time': self.render_time(row['time']),
+        } for row in rows]
+
+
+class QueryRecorder:
+    """
+    wrapper of database executions (connection.execute_wrapper), it records number, time and sql of queries
+    """
+    def __init__(self):
+        self.count = 0
+        self.duration = 0 # total time of queries in seconds
+        self.statements = Counter() # {sql (without params): number of executions}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.statements[sql] += 1
+
+    def top_repeated(self, number=3):
+        """
+        :return: list of (sql, number of executions) of most repeated queries (only queries that executed more than once)
+        """
+        return [(sql, count) for sql, count in self.statements.most_common(number) if count > 1]
+
+
+class PriceSnapshotContextMixin:
+    """
+    mixin of views, a PriceSnapshot is added to serializer context, so pools reserves are loaded once per request (on first price calculating)
+    """
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['price_snapshot'] = PriceSnapshot()
+        return context
+
+
+class QueryBudgetMixin:
+    """
+    mixin of views, records queries of every request and compare them with query_budget of view
+    in debug mode (or QUERY_BUDGET_HEADERS setting) number of queries, time of them and top repeated sql are sent in response headers
+    """
+    query_budget = None # maximum number of queries of a request of this view (None is unlimited)
+
+    def dispatch(self, request, *args, **kwargs):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = super().dispatch(request, *args, **kwargs)
+        response.query_recorder = recorder # for assert_query_budget and benchmarks
+        response.query_budget = self.query_budget
+        if getattr(settings, 'QUERY_BUDGET_HEADERS', settings.DEBUG):
+            response['X-DB-Query-Count'] = str(recorder.count)
+            response['X-DB-Time-Ms'] = f'{recorder.duration * 1000:.2f}'
+            if self.query_budget is not None:
+                response['X-DB-Query-Budget'] = str(self.query_budget)
+            top_repeated = recorder.top_repeated(number=1)
+            if top_repeated:
+                sql, count = top_repeated[0]
+                response['X-DB-Top-Repeated'] = f'{count}x ' + ' '.join(sql.split())[:200].encode('ascii', 'replace').decode()
+        return response
+
+
+def assert_query_budget(response):
+    """
+    test helper, fails if request of this response (of a QueryBudgetMixin view) executed more queries than budget of its view
+    """
+    recorder = response.query_recorder
+    if response.query_budget is not None and recorder.count > response.query_budget:
+        repeated = '\n'.join(f'{count}x {sql}' for sql, count in recorder.top_repeated())
+        raise AssertionError(f'{recorder.count} queries executed but budget is {response.query_budget}, most repeated queries:\n{repeated}')
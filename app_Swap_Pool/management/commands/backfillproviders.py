@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from app_Swap_Providing.models import Provider
+
+class Command(BaseCommand):
+    help = 'Backfill First Deposit Of Providers From Their First History'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='number of providers per query')
+
+    def handle(self, *args, **options):
+        updated = Provider.objects.backfill_primary(chunk_size=options['chunk_size'])
+        return f'first deposit of {updated} providers are backfilled'
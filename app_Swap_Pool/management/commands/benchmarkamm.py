@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from app_Swap_Pool.benchmarks import AMMBenchmark
+
+class Command(BaseCommand):
+    help = 'Benchmark Swap Hot Paths On A Test Database (use sqlite settings for reproducible results)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pools', type=int, default=10, help='number of seeded pools')
+        parser.add_argument('--providers', type=int, default=100, help='number of seeded providers')
+        parser.add_argument('--swaps', type=int, default=10000, help='number of seeded swaps')
+        parser.add_argument('--iterations', type=int, default=50, help='measured calls of every benchmark')
+        parser.add_argument('--warmup', type=int, default=5, help='not measured calls of every benchmark')
+        parser.add_argument('--threads', type=int, default=4, help='threads of concurrent swap benchmark')
+        parser.add_argument('--seed', type=int, default=1, help='seed of random data')
+        parser.add_argument('--only', nargs='*', default=None, help='names of benchmarks (all benchmarks if it is not set)')
+        parser.add_argument('--save', type=str, default=None, help='save report as baseline in this json file')
+        parser.add_argument('--compare', type=str, default=None, help='compare report with baseline of this json file')
+        parser.add_argument('--check-budgets', action='store_true', help='fail if a request executes more queries than query_budget of its view')
+        parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown of p50 in compare (0.2 is 20%%)')
+
+    def handle(self, *args, **options):
+        old_database_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False) # we never touch real database
+        try:
+            benchmark = AMMBenchmark(pools=options['pools'], providers=options['providers'], swaps=options['swaps'], iterations=options['iterations'], warmup=options['warmup'], threads=options['threads'], seed=options['seed'], check_budgets=options['check_budgets'])
+            report = benchmark.run(only=options['only'])
+        except AssertionError as e: # query budget of a view is exceeded
+            raise CommandError(str(e))
+        finally:
+            connection.creation.destroy_test_db(old_database_name, verbosity=0)
+
+        self.stdout.write(f'config: {report["config"]}')
+        self.stdout.write(f'{"benchmark":40} {"p50 ms":>10} {"p90 ms":>10} {"p99 ms":>10} {"max ms":>10} {"queries":>8}')
+        for name, result in report['results'].items():
+            if 'p50' in result:
+                self.stdout.write(f'{name:40} {result["p50"]:10.3f} {result["p90"]:10.3f} {result["p99"]:10.3f} {result["max"]:10.3f} {result["queries"]:8.1f}')
+            else:
+                self.stdout.write(f'{name:40} {result}')
+
+        if options['compare']:
+            baseline = AMMBenchmark.load(options['compare'])
+            if baseline['config'] != report['config']:
+                self.stdout.write(f'baseline config is different: {baseline["config"]}')
+            self.stdout.write(f'{"benchmark":40} {"base p50":>10} {"p50":>10} {"ratio":>7} {"base q":>7} {"q":>7}')
+            for name, base_p50, p50, ratio, base_queries, queries, regression in AMMBenchmark.compare(report, baseline, threshold=options['threshold']):
+                self.stdout.write(f'{name:40} {base_p50:10.3f} {p50:10.3f} {ratio:7.2f} {base_queries:7.1f} {queries:7.1f}' + (' SLOWER' if regression else ''))
+        if options['save']:
+            AMMBenchmark.save(report, options['save'])
+            return f'baseline is saved in {options["save"]}'
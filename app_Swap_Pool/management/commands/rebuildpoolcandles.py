@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from app_Swap_Pool.models import Pool
+from app_Swap_Swaping.models import PoolCandle
+
+class Command(BaseCommand):
+    help = 'Rebuild Candles Of Pools From Swap History'
+
+    def add_arguments(self, parser):
+        parser.add_argument('pool_id', type=int, nargs='?', default=None, help='pool id (all pools if it is not set)')
+
+    def handle(self, *args, **options):
+        if options["pool_id"] is None:
+            PoolCandle.objects.rebuild()
+            return 'candles of all pools are rebuilt'
+        pool = Pool.objects.find_by_id(id=options["pool_id"])
+        if pool:
+            PoolCandle.objects.rebuild(pool=pool)
+            return f'candles of pool {pool.currency_A.symbol}-{pool.currency_B.symbol} are rebuilt'
+        else:
+            return f'pool with id {options["pool_id"]} does not exist'
@@ -0,0 +1,98 @@
+import bisect
+import functools
+import threading
+import time
+from contextlib import nullcontext
+
+from django.conf import settings
+
+
+class Metrics:
+    """
+    timing of hot paths (swap, providing and dashboard) aggregated in process as histograms per operation
+    it's disabled by default (SWAP_METRICS_ENABLED setting), when it's disabled timed functions and spans only check enabled flag
+    """
+    enabled = getattr(settings, 'SWAP_METRICS_ENABLED', False)
+    name = 'swap_operation_duration_seconds'
+    buckets = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5) # upper bounds of histogram buckets in seconds
+    _histograms = {} # {operation: {'buckets': count of every bucket (last one is +Inf), 'sum': total seconds, 'count': number of observations}}
+    _lock = threading.Lock()
+    _disabled_span = nullcontext()
+
+    @classmethod
+    def observe(cls, operation, duration):
+        """
+        :params duration: duration of this operation in seconds
+        """
+        index = bisect.bisect_left(cls.buckets, duration)
+        with cls._lock:
+            histogram = cls._histograms.get(operation)
+            if histogram is None:
+                histogram = cls._histograms[operation] = {'buckets': [0] * (len(cls.buckets) + 1), 'sum': 0.0, 'count': 0}
+            histogram['buckets'][index] += 1
+            histogram['sum'] += duration
+            histogram['count'] += 1
+
+    @classmethod
+    def span(cls, operation):
+        """
+        :return: context manager that observes duration of its block as this operation
+        """
+        return MetricsSpan(operation) if cls.enabled else cls._disabled_span
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._histograms = {}
+
+    @classmethod
+    def export(cls):
+        """
+        :return: histograms of all operations in prometheus text format
+        """
+        with cls._lock:
+            histograms = {operation: {'buckets': list(histogram['buckets']), 'sum': histogram['sum'], 'count': histogram['count']} for operation, histogram in cls._histograms.items()}
+        lines = [f'# HELP {cls.name} Duration of swap hot path operations in seconds.', f'# TYPE {cls.name} histogram']
+        for operation in sorted(histograms):
+            histogram = histograms[operation]
+            cumulative = 0
+            for upper_bound, count in zip(cls.buckets + ('+Inf',), histogram['buckets']):
+                cumulative += count
+                lines.append(f'{cls.name}_bucket{{operation="{operation}",le="{upper_bound}"}} {cumulative}')
+            lines.append(f'{cls.name}_sum{{operation="{operation}"}} {histogram["sum"]}')
+            lines.append(f'{cls.name}_count{{operation="{operation}"}} {histogram["count"]}')
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsSpan:
+    """
+    context manager of Metrics.span (only when metrics is enabled)
+    """
+    def __init__(self, operation):
+        self.operation = operation
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        Metrics.observe(self.operation, time.perf_counter() - self.start)
+        return False
+
+
+def timed(operation):
+    """
+    decorator, observes duration of every call of function as this operation (if metrics is enabled)
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not Metrics.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                Metrics.observe(operation, time.perf_counter() - start)
+        return wrapper
+    return decorator
@@ -1,8 +1,20 @@
-from celery import shared_task
-
-from app_Swap_Pool.models import PoolHistory
-
-
-@shared_task()
-def SnapshotPoolHistory():
-    PoolHistory.objects.snapshot_of_pools()
+from celery import shared_task
+from django.conf import settings
+
+from app_Swap_Pool.models import PoolHistory
+from app_Swap_Pool.classes import HomeSnapshot
+
+
+@shared_task()
+def SnapshotPoolHistory():
+    PoolHistory.objects.snapshot_of_pools()
+
+
+@shared_task()
+def RefreshHomeSnapshot():
+    HomeSnapshot().refresh()
+
+
+@shared_task()
+def CompactPoolHistory():
+    PoolHistory.objects.compact(max_days=getattr(settings, 'POOL_HISTORY_COMPACTION_MAX_DAYS', 30))
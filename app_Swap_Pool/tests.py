@@ -1,3 +1,64 @@
-from django.test import TestCase
-
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TransactionTestCase
+
+from app_Swap_Pool.benchmarks import AMMBenchmark
+from app_Swap_Pool.classes import HomeSnapshot, assert_query_budget
+
+
+class QueryBudgetTestCase(TransactionTestCase):
+    """
+    base of query budget tests, a small market is seeded by AMMBenchmark (CurrenciesPrice, Wallet, JWT authentication and fees are local stand-ins)
+    views are called without permission classes, so every request executes fewer queries than production (budgets count authentication and permissions too)
+    it's TransactionTestCase, so after commit callbacks (candles of swaps) run in request like production
+    """
+    def setUp(self):
+        self.benchmark = AMMBenchmark(pools=4, providers=5, swaps=200, seed=1)
+        self.addCleanup(self.benchmark.stand_ins().close)
+        self.benchmark.seed_data()
+        self.user = self.benchmark.user
+        self.pool = self.benchmark.pools[0] # BTC/IRT (every pool is based on IRT or USDT)
+
+    def request(self, view, method, data=None):
+        """
+        :return: response of this view, fails if view executed more queries than its query_budget
+        """
+        response = self.benchmark.request(view.as_view(permission_classes=[]), method, data)
+        assert_query_budget(response)
+        return response
+
+
+class PoolViewsQueryBudgetTest(QueryBudgetTestCase):
+    def test_pools_detail(self):
+        from app_Swap_Pool.views import PoolsDetailView
+        response = self.request(PoolsDetailView, 'get')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['result']), len(self.benchmark.pools))
+
+    def test_pool_chart(self):
+        from app_Swap_Pool.views import PoolChartView
+        for resolution in ('1m', '1h', '1d'):
+            response = self.request(PoolChartView, 'get', {'pool_id': self.pool.id, 'resolution': resolution})
+            self.assertEqual(response.status_code, 200)
+
+    def test_user_active_pools(self):
+        from app_Swap_Pool.views import UserActivePoolsView
+        response = self.request(UserActivePoolsView, 'get', {'limit': 10})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), len(self.benchmark.pools)) # user of requests provides in all pools
+
+    def test_currencies(self):
+        from app_Swap_Pool.views import CurrenciesView
+        response = self.request(CurrenciesView, 'get')
+        self.assertEqual(response.status_code, 200)
+        response = self.request(CurrenciesView, 'get', {'currency_symbol': self.pool.currency_A.symbol})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['result']), 1)
+
+    def test_home_refreshes_old_report(self):
+        from app_Swap_Pool.views import HomeView
+        self.addCleanup(cache.delete_many, [HomeSnapshot.cache_key, HomeSnapshot.lock_key])
+        cache.delete(HomeSnapshot.lock_key)
+        cache.set(HomeSnapshot.cache_key, {'time': 0, 'report': {}}, timeout=None) # an old report, so request calculates it again (most queries)
+        response = self.request(HomeView, 'get')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(response.data['result']['tvl_irt'])
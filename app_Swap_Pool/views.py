@@ -1,114 +1,158 @@
-from rest_framework import exceptions, generics, status
-from rest_framework_simplejwt import authentication
-from rest_framework.permissions import IsAuthenticated
-from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
-
-from app_Swap_Pool.models import Pool
-
-from .serializers import PoolsDetailSerializers, PoolsCurrenciesSerializers, HomeSerializers
-from app_Utils.permissions import IsLevel1, IsTwoFAEnabled, IsTwoFAValidated, CheckTokenExclusivity
-from app_Swap_Providing.models import Provider
-
-
-class PoolsDetailView(generics.CreateAPIView):
-    serializer_class = PoolsDetailSerializers
-    permission_classes = [IsAuthenticated, IsLevel1, IsTwoFAEnabled, IsTwoFAValidated, CheckTokenExclusivity]
-
-    def get(self, request):
-        ser = self.get_serializer(data=self.request.query_params)
-        if ser.is_valid():
-            return Response({
-                'status': True,
-                'result': ser.validated_data
-            }, status=status.HTTP_200_OK)
-        else:
-            return Response({
-                "status": False,
-                "message": ser.errors[list(ser.errors)[0]][0]
-            }, status=status.HTTP_400_BAD_REQUEST)
-
-
-class UserActivePoolsView(generics.ListAPIView, PageNumberPagination):
-    serializer_class = PoolsDetailSerializers
-    permission_classes = [IsAuthenticated, IsLevel1, IsTwoFAEnabled, IsTwoFAValidated, CheckTokenExclusivity]
-    page_size_query_param = 'limit'
-
-    def get(self, request):
-        user = None
-        if request and hasattr(request, "user"):
-            user = authentication.JWTAuthentication().authenticate(request)[0]
-        if user is None:
-            raise exceptions.ParseError({
-                "status": False,
-                "message": "کاربر یافت نشد"
-            })
-
-        result = Provider.objects.find_pool_by_user(user=user, only_has_liquidity=False)
-        user_pools = result['user_pools']
-        user_providing = result['user_providing']
-        user_pools = self.paginate_queryset(user_pools)
-        user_pools_ser = self.get_serializer(user_pools, many=True).data
-        for index, providing in enumerate(user_providing):
-            user_pools_ser[index]['irt_value'] = providing.pool.cal_total_value_locked(base_currency='IRT')
-            user_pools_ser[index]['user_share'] = providing.get_share()
-            user_pools_ser[index]['user_amount_A'] = providing.get_amount_A()
-            user_pools_ser[index]['user_amount_B'] = providing.get_amount_B()
-
-        return self.get_paginated_response(user_pools_ser)
-
-
-class CurrenciesView(generics.ListAPIView):
-    serializer_class = PoolsCurrenciesSerializers
-    permission_classes = [IsAuthenticated, IsLevel1, IsTwoFAEnabled, IsTwoFAValidated, CheckTokenExclusivity]
-
-    def get(self, request):
-        user = None
-        if request and hasattr(request, "user"):
-            user = authentication.JWTAuthentication().authenticate(request)[0]
-        if user is None:
-            raise exceptions.ParseError({
-                "status": False,
-                "message": "کاربر یافت نشد"
-            })
-
-        try:
-            currency_symbol = self.request.query_params['currency_symbol'].upper()
-        except:
-            currency_symbol = None
-
-        if currency_symbol is not None and not Pool.objects.filter_by_currency(currency_symbol):
-            raise exceptions.ParseError({
-                "status": False,
-                "message": "برای این توکن استخری وجود ندارد"
-            })
-        currencies_symbol = Pool.objects.find_currencies_symbol() if currency_symbol is None else [currency_symbol]
-        request_data = []
-        for currency_symbol in currencies_symbol:
-            request_data.append({'currency_symbol': currency_symbol})
-        ser = self.get_serializer(request_data, many=True)
-        return Response({
-            'status': True,
-            'result': ser.data
-        }, status=status.HTTP_200_OK)
-
-
-class HomeView(generics.ListAPIView):
-    serializer_class = HomeSerializers
-    permission_classes = [IsAuthenticated, IsLevel1, IsTwoFAEnabled, IsTwoFAValidated, CheckTokenExclusivity]
-
-    def get(self, request):
-        user = None
-        if request and hasattr(request, "user"):
-            user = authentication.JWTAuthentication().authenticate(request)[0]
-        if user is None:
-            raise exceptions.ParseError({
-                "status": False,
-                "message": "کاربر یافت نشد"
-            })
-
-        ser = self.get_serializer({}, many=False)
-        return Response({
-            'status': True,
-            'result': ser.data
-        }, status=status.HTTP_200_OK)
+from rest_framework import exceptions, generics, status
+from rest_framework_simplejwt import authentication
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.pagination import PageNumberPagination
+from django.conf import settings
+from django.http import HttpResponse
+import hmac
+
+from app_Swap_Pool.classes import PriceSnapshot, HomeSnapshot, QueryBudgetMixin, PriceSnapshotContextMixin
+from app_Swap_Pool.metrics import Metrics
+
+from .serializers import PoolsDetailSerializers, PoolChartSerializers, PoolsCurrenciesSerializers, HomeSerializers
+from app_Utils.permissions import IsLevel1, IsTwoFAEnabled, IsTwoFAValidated, CheckTokenExclusivity
+from app_Swap_Providing.models import Provider
+
+
+class PoolsDetailView(QueryBudgetMixin, PriceSnapshotContextMixin, generics.CreateAPIView):
+    serializer_class = PoolsDetailSerializers
+    permission_classes = [IsAuthenticated, IsLevel1, IsTwoFAEnabled, IsTwoFAValidated, CheckTokenExclusivity]
+    query_budget = 20 # maximum queries of a request (with authentication and permissions)
+
+    def get(self, request):
+        ser = self.get_serializer(data=self.request.query_params)
+        if ser.is_valid():
+            return Response({
+                'status': True,
+                'result': ser.validated_data
+            }, status=status.HTTP_200_OK)
+        else:
+            return Response({
+                "status": False,
+                "message": ser.errors[list(ser.errors)[0]][0]
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+
+class PoolChartView(QueryBudgetMixin, generics.GenericAPIView):
+    serializer_class = PoolChartSerializers
+    permission_classes = [IsAuthenticated, IsLevel1, IsTwoFAEnabled, IsTwoFAValidated, CheckTokenExclusivity]
+    query_budget = 10
+
+    def get(self, request):
+        ser = self.get_serializer(data=self.request.query_params)
+        if ser.is_valid():
+            return Response({
+                'status': True,
+                'result': ser.validated_data
+            }, status=status.HTTP_200_OK)
+        else:
+            return Response({
+                "status": False,
+                "message": ser.errors[list(ser.errors)[0]][0]
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+
+class UserActivePoolsView(QueryBudgetMixin, generics.ListAPIView, PageNumberPagination):
+    serializer_class = PoolsDetailSerializers
+    permission_classes = [IsAuthenticated, IsLevel1, IsTwoFAEnabled, IsTwoFAValidated, CheckTokenExclusivity]
+    query_budget = 30
+    page_size_query_param = 'limit'
+
+    def get(self, request):
+        user = None
+        if request and hasattr(request, "user"):
+            user = authentication.JWTAuthentication().authenticate(request)[0]
+        if user is None:
+            raise exceptions.ParseError({
+                "status": False,
+                "message": "کاربر یافت نشد"
+            })
+
+        user_providing = self.paginate_queryset(Provider.objects.find_positions_by_user(user=user, only_has_liquidity=False)) # providers of this page with their pools (one joined query)
+        user_pools_ser = self.get_serializer([providing.pool for providing in user_providing], many=True).data
+        positions = Provider.objects.cal_positions(user_providing, base_currency='IRT', price_snapshot=PriceSnapshot()) # all positions of this page with same prices
+        for user_pool_ser, position in zip(user_pools_ser, positions):
+            user_pool_ser['irt_value'] = position['value']
+            user_pool_ser['user_share'] = position['share']
+            user_pool_ser['user_amount_A'] = position['amount_A']
+            user_pool_ser['user_amount_B'] = position['amount_B']
+
+        return self.get_paginated_response(user_pools_ser)
+
+
+class CurrenciesView(QueryBudgetMixin, PriceSnapshotContextMixin, generics.ListAPIView):
+    serializer_class = PoolsCurrenciesSerializers
+    permission_classes = [IsAuthenticated, IsLevel1, IsTwoFAEnabled, IsTwoFAValidated, CheckTokenExclusivity]
+    query_budget = 13 # authentication and permissions (8) + pools, snapshots of 24h ago, stats buckets and fees for all currencies (4) + currency cache (1)
+
+    def get(self, request):
+        user = None
+        if request and hasattr(request, "user"):
+            user = authentication.JWTAuthentication().authenticate(request)[0]
+        if user is None:
+            raise exceptions.ParseError({
+                "status": False,
+                "message": "کاربر یافت نشد"
+            })
+
+        try:
+            currency_symbol = self.request.query_params['currency_symbol'].upper()
+        except:
+            currency_symbol = None
+
+        context = self.get_serializer_context()
+        price_snapshot = context['price_snapshot'] # currencies of pools are read from graph of snapshot (same pools that prices are calculated from them)
+        if currency_symbol is not None and currency_symbol not in price_snapshot.graph:
+            raise exceptions.ParseError({
+                "status": False,
+                "message": "برای این توکن استخری وجود ندارد"
+            })
+        currencies_symbol = list(price_snapshot.graph) if currency_symbol is None else [currency_symbol]
+        request_data = []
+        for currency_symbol in currencies_symbol:
+            request_data.append({'currency_symbol': currency_symbol})
+        ser = self.get_serializer_class()(request_data, many=True, context=context)
+        return Response({
+            'status': True,
+            'result': ser.data
+        }, status=status.HTTP_200_OK)
+
+
+class HomeView(QueryBudgetMixin, generics.ListAPIView):
+    serializer_class = HomeSerializers
+    permission_classes = [IsAuthenticated, IsLevel1, IsTwoFAEnabled, IsTwoFAValidated, CheckTokenExclusivity]
+    query_budget = 13 # authentication and permissions (8) + refreshing an old report in request: pools, snapshots of 24h ago, fees and volumes of 24h and 48h (5)
+
+    def get(self, request):
+        user = None
+        if request and hasattr(request, "user"):
+            user = authentication.JWTAuthentication().authenticate(request)[0]
+        if user is None:
+            raise exceptions.ParseError({
+                "status": False,
+                "message": "کاربر یافت نشد"
+            })
+
+        return Response({
+            'status': True,
+            'result': HomeSnapshot().get() # home report is calculated by RefreshHomeSnapshot task and served from cache
+        }, status=status.HTTP_200_OK)
+
+
+class MetricsView(generics.GenericAPIView):
+    """
+    timing histograms of this process in prometheus text format
+    scrapers send SWAP_METRICS_TOKEN setting as bearer token (Authorization: Bearer <token>), if it's not set metrics are not served
+    """
+    authentication_classes = [] # it's not a jwt token, so it's checked here
+    permission_classes = []
+
+    def get(self, request):
+        token = getattr(settings, 'SWAP_METRICS_TOKEN', None)
+        if not token or not hmac.compare_digest(request.META.get('HTTP_AUTHORIZATION', '').encode(), f'Bearer {token}'.encode()):
+            return Response({
+                "status": False,
+                "message": "دسترسی به این بخش مجاز نیست"
+            }, status=status.HTTP_403_FORBIDDEN)
+        return HttpResponse(Metrics.export(), content_type='text/plain; version=0.0.4; charset=utf-8')
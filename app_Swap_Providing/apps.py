@@ -1,5 +1,5 @@
-from django.apps import AppConfig
-
-
-class AppSwapProviderConfig(AppConfig):
-    name = 'app_Swap_Providing'
+from django.apps import AppConfig
+
+
+class AppSwapProviderConfig(AppConfig):
+    name = 'app_Swap_Providing'
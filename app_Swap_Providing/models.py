@@ -1,190 +1,275 @@
-from django.db import models
-from django.utils import timezone
-import math
-
-from app_User.models import User
-from app_Swap_Pool.models import Pool
-
-
-class ProviderManager(models.Manager):
-    def find_by_id(self, id):
-        return self.filter(id=id).first()
-
-    def find_by_user(self, user):
-        """
-        :return: find all provider objects of this user
-        """
-        return self.filter(user=user).order_by('pool__rank')
-
-    def find_by_user_pool(self, user, pool):
-        """
-        :return: find this user provider object for this pool
-        """
-        return self.filter(user=user, pool=pool).first()
-    
-    def find_by_pool(self, pool):
-        """
-        :return: find all provider objects of this pool
-        """
-        return self.filter(pool=pool).order_by('pool__rank')
-
-    def find_pool_by_user(self, user, only_has_liquidity=False):
-        """
-        :param only_has_liquidity: if it's True, we only return objects that have liquidity
-        :return: find all pool objects that this user activating them before
-        """
-        user_providing = self.filter(user=user, lp_tokens__gt=0).order_by('pool__rank') if only_has_liquidity else self.filter(user=user).order_by('pool__rank')
-        user_pools = []
-        for providing in user_providing:
-            user_pools.append(providing.pool)
-        return {'user_pools': user_pools, 'user_providing': user_providing}
-
-    def create_new_provider(self, user, pool, amount_A, amount_B):
-        lp_tokens_received = math.sqrt(amount_A * amount_B)
-        new_provider = self.create(
-            user=user,
-            pool=pool,
-            lp_tokens=lp_tokens_received,
-        )
-        new_provider.pool.increase_liquidity(amount_A, amount_B)
-        new_provider.pool.increase_lp_tokens(lp_tokens_received)
-        return new_provider
-
-
-class Provider(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE, default=True, related_name='Provider_User')
-    pool = models.ForeignKey(Pool, on_delete=models.CASCADE, default=True, related_name='Provider_Pool')
-    lp_tokens = models.FloatField(null=False, blank=False, default=0.0)
-    time = models.DateTimeField(default=timezone.now)
-
-    objects = ProviderManager()
-
-
-    def get_share(self):
-        """
-        :return: get current share bases on provider lp tokens and pool lp tokens
-        """
-        return (self.lp_tokens / self.pool.lp_tokens) if self.pool.lp_tokens else 0
-
-    def get_amount_A(self):
-        return (self.lp_tokens / self.pool.lp_tokens) * self.pool.amount_A if self.pool.lp_tokens else 0 # calculating provider amount_A based on user share and pool amount
-
-    def get_amount_B(self):
-        return (self.lp_tokens / self.pool.lp_tokens) * self.pool.amount_B if self.pool.lp_tokens else 0 # calculating provider amount_B based on user share and pool amount
-        
-    def add_liquidity(self, amount_A, amount_B):
-        received_lp_tokens = math.sqrt(amount_A * amount_B) # calculating lp tokens that's provider will receive (sqrt(x*y))
-        self.lp_tokens += received_lp_tokens
-        self.pool.lp_tokens += received_lp_tokens
-        self.pool.amount_A += amount_A
-        self.pool.amount_B += amount_B
-        self.pool.save()
-        return self.save()
-
-    def remove_liquidity(self, share, update_pool=True):
-        """
-        :params share: share of liquidity that we want remove
-        :params update_pool: if it's True, thats mean we are in real remove liquidity not pre remove liquidity
-        :return: received_amount_A, received_amount_B, burn_lp_tokens
-        """
-        if self.lp_tokens:
-            burn_lp_tokens = self.lp_tokens * share
-            received_amount_A = self.pool.amount_A * (burn_lp_tokens / self.pool.lp_tokens)
-            received_amount_B = self.pool.amount_B * (burn_lp_tokens / self.pool.lp_tokens)
-            if update_pool:
-                self.lp_tokens -= burn_lp_tokens
-                self.pool.lp_tokens -= burn_lp_tokens
-                self.pool.amount_A -= received_amount_A
-                self.pool.amount_B -= received_amount_B
-                self.pool.save()
-                self.save()
-            return [received_amount_A, received_amount_B, burn_lp_tokens]
-
-
-class ProviderHistoryManager(models.Manager):
-    def find_by_id(self, id):
-        return self.filter(id=id).first()
-
-    def find_by_provider(self, provider):
-        """
-        :param provider: find first history of this provider
-        :return: find first provider history
-        """
-        return self.filter(provider=provider).order_by('time').first()
-
-    def find_by_last(self, pool_id=None):
-        """
-        :param pool_id: the pool_id that we want receive history of that
-        :return: descending list of all transaction of this pool
-        """
-        if not pool_id:
-            return self.all().order_by('-time')
-        else:
-            # Bad Algorithm
-            all = self.all().order_by('-time')
-            result = []
-            for provider_transaction in all:
-                if provider_transaction.provider.pool.id == pool_id:
-                    result.append(provider_transaction)
-            return result
-    
-    def find_by_pool_time(self, start_date, end_date, pool=None):
-        """
-        :param start_date: datetime object
-        :param end_date: datetime object
-        :param pool: if is None, return history of all pools
-        :return: all history in [start_date, end_date] time range
-        """
-        return self.filter(provider__pool=pool, time__range=(start_date, end_date)).order_by('-time') if pool else self.filter(time__range=(start_date, end_date)).order_by('-time')
-
-    def create_new_tx(self, provider, type, amount_A, amount_B, lp_tokens_difference, lp_tokens_pool):
-        """
-        :return: create new transaction
-        """
-        return self.create(
-            provider=provider,
-            type=type,
-            amount_A=amount_A,
-            amount_B=amount_B,
-            lp_tokens_difference=lp_tokens_difference,
-            lp_tokens_pool=lp_tokens_pool,
-            equivalent_irt = amount_A * Pool.objects.cal_price(currency_symbol=provider.pool.currency_A.symbol, base_currency_symbol='IRT') + amount_B * Pool.objects.cal_price(currency_symbol=provider.pool.currency_B.symbol, base_currency_symbol='IRT'),
-            equivalent_usdt = amount_A * Pool.objects.cal_price(currency_symbol=provider.pool.currency_A.symbol, base_currency_symbol='USDT') + amount_B * Pool.objects.cal_price(currency_symbol=provider.pool.currency_B.symbol, base_currency_symbol='USDT'),
-            equivalent_btc = amount_A * Pool.objects.cal_price(currency_symbol=provider.pool.currency_A.symbol, base_currency_symbol='BTC') + amount_B * Pool.objects.cal_price(currency_symbol=provider.pool.currency_B.symbol, base_currency_symbol='BTC')
-        )
-
-
-class ProviderHistory(models.Model):
-    provider = models.ForeignKey(Provider, on_delete=models.CASCADE, default=True, related_name='ProviderHistory_Provider')
-    type_choices = [('add', 'add'), ('remove', 'remove')]
-    type = models.CharField(max_length=6, choices=type_choices, default='add')
-    amount_A = models.FloatField(null=True, blank=True)
-    amount_B = models.FloatField(null=True, blank=True)
-    lp_tokens_pool = models.FloatField(null=False, blank=False, default=0.0)
-    lp_tokens_difference = models.FloatField(null=False, blank=False, default=0.0)
-    equivalent_irt = models.FloatField(null=True, blank=True, default=0)
-    equivalent_usdt = models.FloatField(null=True, blank=True, default=0)
-    equivalent_btc = models.FloatField(null=True, blank=True, default=0)
-    time = models.DateTimeField(default=timezone.now)
-
-    objects = ProviderHistoryManager()
-
-    def cal_pool_total_value_locked(self, base_currency=None):
-        """
-        :param base_currency: value calculating based on this currency
-        :return: tvl of this pool at the time of this transaction
-        """
-        if self.type == 'add':
-            if self.lp_tokens_pool == self.lp_tokens_difference: # first transaction
-                pool_amount_A = self.amount_A
-                pool_amount_B = self.amount_B
-            else:
-                before_share = self.lp_tokens_difference / (self.lp_tokens_pool - self.lp_tokens_difference) # share percent of this lp_token before transaction
-                pool_amount_A = (self.amount_A / before_share) + self.amount_A # pool amount_A after this transaction
-                pool_amount_B = (self.amount_B / before_share) + self.amount_B # pool amount_B after this transaction
-            return self.provider.pool.cal_total_value_locked(base_currency, pool_amount_A, pool_amount_B) # call cal_total_value_locked with specific amounts
-        else:
-            before_share = self.lp_tokens_difference / (self.lp_tokens_pool + self.lp_tokens_difference) # share percent of this lp_token before transaction
-            pool_amount_A = (self.amount_A / before_share) - self.amount_A # pool amount_A after this transaction
-            pool_amount_B = (self.amount_B / before_share) - self.amount_B # pool amount_B after this transaction
-            return self.provider.pool.cal_total_value_locked(base_currency, pool_amount_A, pool_amount_B) # call cal_total_value_locked with specific amounts
+from django.db import models, transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+import math
+
+from app_User.models import User
+from app_Swap_Pool.models import Pool
+
+
+class ProviderManager(models.Manager):
+    def find_by_id(self, id):
+        return self.filter(id=id).first()
+
+    def find_by_user(self, user):
+        """
+        :return: find all provider objects of this user
+        """
+        return self.filter(user=user).order_by('pool__rank')
+
+    def find_by_user_pool(self, user, pool):
+        """
+        :return: find this user provider object for this pool
+        """
+        return self.filter(user=user, pool=pool).first()
+    
+    def find_by_pool(self, pool):
+        """
+        :return: find all provider objects of this pool
+        """
+        return self.filter(pool=pool).order_by('pool__rank')
+
+    def find_by_user_pools(self, user, pools):
+        """
+        :return: provider objects of this user in these pools with one query, {pool_id: provider}
+        """
+        providers = {}
+        for provider in self.filter(user=user, pool__in=pools).order_by('id'):
+            providers.setdefault(provider.pool_id, provider)
+        return providers
+
+    def find_pool_by_user(self, user, only_has_liquidity=False):
+        """
+        :param only_has_liquidity: if it's True, we only return objects that have liquidity
+        :return: find all pool objects that this user activating them before
+        """
+        user_providing = self.filter(user=user, lp_tokens__gt=0).order_by('pool__rank') if only_has_liquidity else self.filter(user=user).order_by('pool__rank')
+        user_pools = []
+        for providing in user_providing:
+            user_pools.append(providing.pool)
+        return {'user_pools': user_pools, 'user_providing': user_providing}
+
+    def find_positions_by_user(self, user, only_has_liquidity=False):
+        """
+        :param only_has_liquidity: if it's True, we only return objects that have liquidity
+        :return: queryset of provider objects of this user with their pools and currencies (one joined query), ordered by pool rank
+        """
+        providers = self.filter(user=user, lp_tokens__gt=0) if only_has_liquidity else self.filter(user=user)
+        return providers.select_related('pool__currency_A', 'pool__currency_B').order_by('pool__rank', 'id')
+
+    def cal_positions(self, providers, base_currency='IRT', price_snapshot=None):
+        """
+        :param providers: provider objects with loaded pools (find_positions_by_user)
+        :param price_snapshot: PriceSnapshot object, all pools are valued with same prices
+        :return: list of positions in order of providers, {'value': tvl of pool based on base_currency, 'share', 'amount_A', 'amount_B'}
+        """
+        pools_value = {} # tvl of every pool is calculated once
+        positions = []
+        for provider in providers:
+            pool = provider.pool
+            if pool.id not in pools_value:
+                pools_value[pool.id] = pool.cal_total_value_locked(base_currency=base_currency, price_snapshot=price_snapshot)
+            share = (provider.lp_tokens / pool.lp_tokens) if pool.lp_tokens else 0
+            positions.append({
+                'value': pools_value[pool.id],
+                'share': share,
+                'amount_A': share * pool.amount_A, # provider amount_A based on share and pool amount
+                'amount_B': share * pool.amount_B, # provider amount_B based on share and pool amount
+            })
+        return positions
+
+    def create_new_provider(self, user, pool, amount_A, amount_B):
+        """
+        pool should be locked (Pool.objects.lock_by_id) in transaction of caller
+        """
+        lp_tokens_received = math.sqrt(amount_A * amount_B)
+        with transaction.atomic(): # pool and its new provider are saved together
+            pool.increase_liquidity(amount_A, amount_B)
+            pool.increase_lp_tokens(lp_tokens_received)
+            new_provider = self.create(
+                user=user,
+                pool=pool,
+                lp_tokens=lp_tokens_received,
+                primary_share=lp_tokens_received / pool.lp_tokens if pool.lp_tokens else 0, # first deposit is saved here, so we don't need first history of provider
+                primary_amount_A=amount_A,
+                primary_amount_B=amount_B,
+            )
+        return new_provider
+
+    def backfill_primary(self, chunk_size=1000):
+        """
+        save first deposit (primary share and amounts) of providers that don't have it, from their first history
+        :return: number of updated providers
+        """
+        updated = 0
+        last_id = 0
+        while True:
+            providers = list(self.filter(primary_share__isnull=True, id__gt=last_id).order_by('id')[:chunk_size])
+            if not providers:
+                return updated
+            last_id = providers[-1].id
+            first_transactions = ProviderHistory.objects.find_first_by_providers(providers) # first history of all providers of this chunk with one query
+            backfilled = []
+            for provider in providers:
+                first_transaction = first_transactions.get(provider.id)
+                if first_transaction is None: # provider without history, we can't backfill it
+                    continue
+                provider.primary_share = first_transaction.lp_tokens_difference / first_transaction.lp_tokens_pool if first_transaction.lp_tokens_pool else 0
+                provider.primary_amount_A = first_transaction.amount_A
+                provider.primary_amount_B = first_transaction.amount_B
+                backfilled.append(provider)
+            self.bulk_update(backfilled, ['primary_share', 'primary_amount_A', 'primary_amount_B'])
+            updated += len(backfilled)
+
+class Provider(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, default=True, related_name='Provider_User')
+    pool = models.ForeignKey(Pool, on_delete=models.CASCADE, default=True, related_name='Provider_Pool')
+    lp_tokens = models.FloatField(null=False, blank=False, default=0.0)
+    primary_share = models.FloatField(null=True, blank=True) # share of first deposit (None if it's not backfilled yet)
+    primary_amount_A = models.FloatField(null=True, blank=True)
+    primary_amount_B = models.FloatField(null=True, blank=True)
+    time = models.DateTimeField(default=timezone.now)
+
+    objects = ProviderManager()
+
+
+    def get_share(self):
+        """
+        :return: get current share bases on provider lp tokens and pool lp tokens
+        """
+        return (self.lp_tokens / self.pool.lp_tokens) if self.pool.lp_tokens else 0
+
+    def get_amount_A(self):
+        return (self.lp_tokens / self.pool.lp_tokens) * self.pool.amount_A if self.pool.lp_tokens else 0 # calculating provider amount_A based on user share and pool amount
+
+    def get_amount_B(self):
+        return (self.lp_tokens / self.pool.lp_tokens) * self.pool.amount_B if self.pool.lp_tokens else 0 # calculating provider amount_B based on user share and pool amount
+        
+    def add_liquidity(self, amount_A, amount_B):
+        """
+        pool of provider should be locked (Pool.objects.lock_by_id) in this transaction, we only write changed fields
+        """
+        received_lp_tokens = math.sqrt(amount_A * amount_B) # calculating lp tokens that's provider will receive (sqrt(x*y))
+        self.lp_tokens += received_lp_tokens
+        self.pool.lp_tokens += received_lp_tokens
+        self.pool.amount_A += amount_A
+        self.pool.amount_B += amount_B
+        self.pool.save(update_fields=['amount_A', 'amount_B', 'lp_tokens'])
+        return self.save(update_fields=['lp_tokens'])
+
+    def remove_liquidity(self, share, update_pool=True):
+        """
+        :params share: share of liquidity that we want remove
+        :params update_pool: if it's True, thats mean we are in real remove liquidity not pre remove liquidity (pool of provider should be locked in this transaction)
+        :return: received_amount_A, received_amount_B, burn_lp_tokens
+        """
+        if self.lp_tokens:
+            burn_lp_tokens = self.lp_tokens * share
+            received_amount_A = self.pool.amount_A * (burn_lp_tokens / self.pool.lp_tokens)
+            received_amount_B = self.pool.amount_B * (burn_lp_tokens / self.pool.lp_tokens)
+            if update_pool:
+                self.lp_tokens -= burn_lp_tokens
+                self.pool.lp_tokens -= burn_lp_tokens
+                self.pool.amount_A -= received_amount_A
+                self.pool.amount_B -= received_amount_B
+                self.pool.save(update_fields=['amount_A', 'amount_B', 'lp_tokens'])
+                self.save(update_fields=['lp_tokens'])
+            return [received_amount_A, received_amount_B, burn_lp_tokens]
+
+
+class ProviderHistoryManager(models.Manager):
+    def find_by_id(self, id):
+        return self.filter(id=id).first()
+
+    def find_by_provider(self, provider):
+        """
+        :param provider: find first history of this provider
+        :return: find first provider history
+        """
+        return self.filter(provider=provider).order_by('time').first()
+
+    def find_first_by_providers(self, providers):
+        """
+        :param providers: list (or queryset) of providers
+        :return: first history of every provider with one query, {provider_id: provider history}
+        """
+        first_id = self.filter(provider=OuterRef('provider')).order_by('time').values('id')[:1]
+        return {history.provider_id: history for history in self.filter(provider__in=providers, id=Subquery(first_id))}
+
+    def find_by_last(self, pool_id=None):
+        """
+        :param pool_id: the pool_id that we want receive history of that
+        :return: descending queryset of all transaction of this pool (providers and their users and pools are joined)
+        """
+        history = self.select_related('provider__user', 'provider__pool').order_by('-time')
+        return history.filter(provider__pool_id=pool_id) if pool_id else history
+    
+    def find_by_pool_time(self, start_date, end_date, pool=None):
+        """
+        :param start_date: datetime object
+        :param end_date: datetime object
+        :param pool: if is None, return history of all pools
+        :return: all history in [start_date, end_date] time range
+        """
+        return self.filter(provider__pool=pool, time__range=(start_date, end_date)).order_by('-time') if pool else self.filter(time__range=(start_date, end_date)).order_by('-time')
+
+    def create_new_tx(self, provider, type, amount_A, amount_B, lp_tokens_difference, lp_tokens_pool, price_snapshot=None):
+        """
+        :param price_snapshot: PriceSnapshot object of this request for calculating equivalent values
+        :return: create new transaction
+        """
+        if price_snapshot is not None:
+            price_snapshot.update_pool(provider.pool) # reserves of this pool changed in this transaction
+        return self.create(
+            provider=provider,
+            type=type,
+            amount_A=amount_A,
+            amount_B=amount_B,
+            lp_tokens_difference=lp_tokens_difference,
+            lp_tokens_pool=lp_tokens_pool,
+            equivalent_irt = amount_A * Pool.objects.cal_price(currency_symbol=provider.pool.currency_A.symbol, base_currency_symbol='IRT', price_snapshot=price_snapshot) + amount_B * Pool.objects.cal_price(currency_symbol=provider.pool.currency_B.symbol, base_currency_symbol='IRT', price_snapshot=price_snapshot),
+            equivalent_usdt = amount_A * Pool.objects.cal_price(currency_symbol=provider.pool.currency_A.symbol, base_currency_symbol='USDT', price_snapshot=price_snapshot) + amount_B * Pool.objects.cal_price(currency_symbol=provider.pool.currency_B.symbol, base_currency_symbol='USDT', price_snapshot=price_snapshot),
+            equivalent_btc = amount_A * Pool.objects.cal_price(currency_symbol=provider.pool.currency_A.symbol, base_currency_symbol='BTC', price_snapshot=price_snapshot) + amount_B * Pool.objects.cal_price(currency_symbol=provider.pool.currency_B.symbol, base_currency_symbol='BTC', price_snapshot=price_snapshot)
+        )
+
+
+class ProviderHistory(models.Model):
+    provider = models.ForeignKey(Provider, on_delete=models.CASCADE, default=True, related_name='ProviderHistory_Provider')
+    type_choices = [('add', 'add'), ('remove', 'remove')]
+    type = models.CharField(max_length=6, choices=type_choices, default='add')
+    amount_A = models.FloatField(null=True, blank=True)
+    amount_B = models.FloatField(null=True, blank=True)
+    lp_tokens_pool = models.FloatField(null=False, blank=False, default=0.0)
+    lp_tokens_difference = models.FloatField(null=False, blank=False, default=0.0)
+    equivalent_irt = models.FloatField(null=True, blank=True, default=0)
+    equivalent_usdt = models.FloatField(null=True, blank=True, default=0)
+    equivalent_btc = models.FloatField(null=True, blank=True, default=0)
+    time = models.DateTimeField(default=timezone.now)
+
+    objects = ProviderHistoryManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['provider', '-time', '-id'], name='providerhistory_provider_time'), # history of providers (of a pool) from last to first (same as keyset pagination order)
+        ]
+
+    def cal_pool_total_value_locked(self, base_currency=None, price_snapshot=None):
+        """
+        :param base_currency: value calculating based on this currency
+        :param price_snapshot: PriceSnapshot object for calculating prices
+        :return: tvl of this pool at the time of this transaction
+        """
+        if self.type == 'add':
+            if self.lp_tokens_pool == self.lp_tokens_difference: # first transaction
+                pool_amount_A = self.amount_A
+                pool_amount_B = self.amount_B
+            else:
+                before_share = self.lp_tokens_difference / (self.lp_tokens_pool - self.lp_tokens_difference) # share percent of this lp_token before transaction
+                pool_amount_A = (self.amount_A / before_share) + self.amount_A # pool amount_A after this transaction
+                pool_amount_B = (self.amount_B / before_share) + self.amount_B # pool amount_B after this transaction
+            return self.provider.pool.cal_total_value_locked(base_currency, pool_amount_A, pool_amount_B, price_snapshot=price_snapshot) # call cal_total_value_locked with specific amounts
+        else:
+            before_share = self.lp_tokens_difference / (self.lp_tokens_pool + self.lp_tokens_difference) # share percent of this lp_token before transaction
+            pool_amount_A = (self.amount_A / before_share) - self.amount_A # pool amount_A after this transaction
+            pool_amount_B = (self.amount_B / before_share) - self.amount_B # pool amount_B after this transaction
+            return self.provider.pool.cal_total_value_locked(base_currency, pool_amount_A, pool_amount_B, price_snapshot=price_snapshot) # call cal_total_value_locked with specific amounts
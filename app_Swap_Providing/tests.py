@@ -1,3 +1,36 @@
-from django.test import TestCase
-
-# Create your tests here.
+from app_Swap_Pool.tests import QueryBudgetTestCase
+
+
+class ProvidingViewsQueryBudgetTest(QueryBudgetTestCase):
+    def providing_data(self):
+        """
+        :return: request data of adding 0.01 percent of reserves of first pool
+        """
+        self.pool.refresh_from_db()
+        amount_A = self.pool.amount_A * 0.0001
+        return {'currency_A_symbol': self.pool.currency_A.symbol, 'currency_B_symbol': self.pool.currency_B.symbol, 'amount_A': amount_A, 'amount_B': self.pool.cal_price() * amount_A}
+
+    def test_pre_providing(self):
+        from app_Swap_Providing.views import ProvidingView
+        data = self.providing_data()
+        response = self.request(ProvidingView, 'get', {'currency_A_symbol': data['currency_A_symbol'], 'currency_B_symbol': data['currency_B_symbol'], 'amount_A': data['amount_A'], 'type': 'add'})
+        self.assertEqual(response.status_code, 200)
+        response = self.request(ProvidingView, 'get', {'currency_A_symbol': data['currency_A_symbol'], 'currency_B_symbol': data['currency_B_symbol'], 'remove_percent': 0.1, 'type': 'remove'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_add_liquidity(self):
+        from app_Swap_Providing.views import ProvidingView
+        response = self.request(ProvidingView, 'post', self.providing_data())
+        self.assertEqual(response.status_code, 201)
+
+    def test_remove_liquidity(self):
+        from app_Swap_Providing.views import ProvidingView
+        data = self.providing_data()
+        response = self.request(ProvidingView, 'put', {'currency_A_symbol': data['currency_A_symbol'], 'currency_B_symbol': data['currency_B_symbol'], 'remove_percent': 0.1})
+        self.assertEqual(response.status_code, 201)
+
+    def test_provider_history(self):
+        from app_Swap_Providing.views import ProviderHistoryView
+        for data in ({'limit': 100}, {'limit': 100, 'pool_id': self.pool.id}, {'pagination': 'cursor', 'limit': 100}, {'count': 'estimated', 'limit': 100}):
+            response = self.request(ProviderHistoryView, 'get', data)
+            self.assertEqual(response.status_code, 200)
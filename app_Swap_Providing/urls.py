@@ -1,7 +1,7 @@
-from django.urls import path
-from .views import *
-
-urlpatterns = [
-    path('', ProvidingView.as_view()),
-    path('History/', ProviderHistoryView.as_view()),
-]
+from django.urls import path
+from .views import *
+
+urlpatterns = [
+    path('', ProvidingView.as_view()),
+    path('History/', ProviderHistoryView.as_view()),
+]
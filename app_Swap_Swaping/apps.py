@@ -1,5 +1,5 @@
-from django.apps import AppConfig
-
-
-class AppSwapSwapConfig(AppConfig):
-    name = 'app_Swap_Swaping'
+from django.apps import AppConfig
+
+
+class AppSwapSwapConfig(AppConfig):
+    name = 'app_Swap_Swaping'
@@ -0,0 +1,350 @@
+from django.conf import settings
+from django.db import transaction
+
+from app_Swap_Pool.models import Pool
+from app_Swap_Pool.classes import PriceSnapshot, FeeConfig
+from app_Swap_Pool.metrics import timed
+from app_Swap_Swaping.models import SwapHistory, SwapOrder
+from app_Wallet.models import Wallet
+
+
+class SwapRouter:
+    """
+    find the best output path of pools (up to max_hops pools) for swaping a currency to another one and doing all swaps of that path
+    """
+    def __init__(self, price_snapshot=None, max_hops=None, fees=None):
+        """
+        :params price_snapshot: PriceSnapshot object that we read pools graph from it
+        :params max_hops: maximum number of pools in a route (default is SWAP_ROUTER_MAX_HOPS setting or 3)
+        :params fees: FeeConfig object that all quotes of this router use it (default is current fees)
+        """
+        self.fees = FeeConfig.current() if fees is None else fees
+        self.price_snapshot = PriceSnapshot() if price_snapshot is None else price_snapshot
+        self.max_hops = getattr(settings, 'SWAP_ROUTER_MAX_HOPS', 3) if max_hops is None else max_hops
+
+    def find_routes(self, input_currency_symbol, output_currency_symbol):
+        """
+        :return: all routes from input currency to output currency, every route is a list of (pool, is_reverse)
+        """
+        graph = self.price_snapshot.graph
+        routes = []
+
+        def search(currency_symbol, route, visited):
+            if currency_symbol == output_currency_symbol:
+                routes.append(route)
+                return
+            if len(route) >= self.max_hops:
+                return
+            for neighbour_symbol, pools_id in graph.get(currency_symbol, {}).items():
+                if neighbour_symbol in visited:
+                    continue
+                for pool_id in pools_id:
+                    pool = self.price_snapshot.pools[pool_id]
+                    if pool.suspend_swap or pool.amount_A <= 0 or pool.amount_B <= 0: # we can't swap in this pool
+                        continue
+                    search(neighbour_symbol, route + [(pool, pool.currency_A.symbol != currency_symbol)], visited | {neighbour_symbol})
+
+        search(input_currency_symbol, [], {input_currency_symbol})
+        return routes
+
+    def quote(self, route, input_amount):
+        """
+        :params route: list of (pool, is_reverse)
+        :params input_amount: input amount of first pool
+        :return: pre swaping of every leg of this route (output of every leg is input of next leg) and the whole route
+        """
+        legs = []
+        amount = input_amount
+        before_price = 1
+        after_price = 1
+        for pool, is_reverse in route:
+            swaping = pool.cal_swaping(amount, is_reverse, self.fees.total_fee, self.fees.providers_fee)
+            legs.append({
+                'pool': pool,
+                'is_reverse': is_reverse,
+                'input_amount': amount,
+                'before_price': pool.cal_price(is_reverse=is_reverse),
+                **swaping
+            })
+            before_price *= pool.cal_price(is_reverse=is_reverse)
+            after_price *= swaping['final_price']
+            amount = swaping['output_amount']
+        return {
+            'legs': legs,
+            'input_amount': input_amount,
+            'output_amount': amount,
+            'before_price': before_price,
+            'after_price': after_price,
+            'slippage_tolerance': 1 - (after_price / before_price)
+        }
+
+    def find_best_route(self, input_currency_symbol, output_currency_symbol, input_amount):
+        """
+        :return: quote of the route with maximum output amount, None if there is no route
+        """
+        best_quote = None
+        for route in self.find_routes(input_currency_symbol, output_currency_symbol):
+            quote = self.quote(route, input_amount)
+            if best_quote is None or quote['output_amount'] > best_quote['output_amount']:
+                best_quote = quote
+        return best_quote
+
+    def lock(self, route):
+        """
+        lock all pools of this route in order of id (so concurrent routes never deadlock), it should be called in a transaction
+        :params route: list of (pool, is_reverse)
+        :return: same route with locked (fresh) pools
+        """
+        pools_id = sorted({pool.id for pool, is_reverse in route})
+        pools = {pool.id: pool for pool in Pool.objects.select_for_update(of=('self',)).select_related('currency_A', 'currency_B').filter(id__in=pools_id).order_by('id')} # only pool rows are locked (not joined currencies)
+        return [(pools[pool.id], is_reverse) for pool, is_reverse in route]
+
+    def lock_route(self, quote):
+        """
+        lock all pools of this quoted route, it should be called in a transaction
+        :return: quote of same route with locked (fresh) pools
+        """
+        route = self.lock([(leg['pool'], leg['is_reverse']) for leg in quote['legs']])
+        return self.quote(route, quote['input_amount'])
+
+    @timed('swap.execute')
+    def execute(self, user, quote):
+        """
+        doing all swaps of this (locked) route, it should be called in the same transaction of lock or lock_route
+        :return: list of SwapHistory objects (one object per leg)
+        """
+        swaps = []
+        for leg in quote['legs']:
+            pool = leg['pool']
+            pool.amount_A = leg['final_amount_A']
+            pool.amount_B = leg['final_amount_B']
+            pool.save(update_fields=['amount_A', 'amount_B']) # we only write reserves of pool
+            swaps.append(SwapHistory.objects.create_new_swap(
+                user=user,
+                pool=pool,
+                input_currency=pool.currency_B if leg['is_reverse'] else pool.currency_A,
+                output_currency=pool.currency_A if leg['is_reverse'] else pool.currency_B,
+                input_amount=leg['input_amount'],
+                output_amount=leg['output_amount'],
+                fee_amount=leg['fee_amount'],
+                before_price=leg['before_price'],
+                after_price=leg['final_price'],
+                slippage_tolerance=leg['slippage_tolerance'],
+                price_snapshot=self.price_snapshot,
+                fee_percentage=self.fees.total_fee
+            ))
+        return swaps
+
+
+class SwapSequencer:
+    """
+    queued swaping: swap orders of every pool are settled in arrival order by one celery queue per pool (SettlePoolSwaps task)
+    a batch of orders is applied to reserves in memory and committed with one pool update and one bulk insert of swap histories
+    """
+    def __init__(self, batch_size=None):
+        """
+        :params batch_size: maximum number of orders in one batch (default is SWAP_SEQUENCER_BATCH_SIZE setting or 100)
+        """
+        self.batch_size = getattr(settings, 'SWAP_SEQUENCER_BATCH_SIZE', 100) if batch_size is None else batch_size
+
+    def queue_name(self, pool_id):
+        """
+        :return: celery queue of this pool (every queue should have a worker with concurrency 1)
+        """
+        return f"{getattr(settings, 'SWAP_SEQUENCER_QUEUE_PREFIX', 'swap_pool_')}{pool_id}"
+
+    def enqueue(self, user, pool, is_reverse, input_amount, max_slippage_tolerance):
+        """
+        save a swap order and send its pool to settlement queue
+        :return: swap order object (result handle)
+        """
+        from app_Swap_Swaping.tasks import SettlePoolSwaps
+        order = SwapOrder.objects.create(user=user, pool=pool, is_reverse=is_reverse, input_amount=input_amount, max_slippage_tolerance=max_slippage_tolerance)
+        transaction.on_commit(lambda: SettlePoolSwaps.apply_async(args=[pool.id], queue=self.queue_name(pool.id)))
+        return order
+
+    def fail(self, order, message):
+        order.status = 'failed'
+        order.message = message
+
+    def settle(self, pool_id):
+        """
+        apply pending orders of this pool in arrival order and commit them together
+        :return: settled orders
+        """
+        fees = FeeConfig.current() # same fees for all orders of this batch
+        price_snapshot = PriceSnapshot()
+        with transaction.atomic():
+            pool = Pool.objects.select_for_update(of=('self',)).select_related('currency_A', 'currency_B').filter(id=pool_id).first() # only pool row is locked (not its currencies)
+            if pool is None:
+                return []
+            orders = list(SwapOrder.objects.find_pending_by_pool(pool, self.batch_size))
+            swaps = []
+            for order in orders:
+                if pool.suspend_swap is True:
+                    self.fail(order, "تا اطلاع ثانوی سواپ در این استخر غیرفعال می باشد")
+                    continue
+                before_price = pool.cal_price(is_reverse=order.is_reverse)
+                if before_price <= 0 or pool.amount_A == 0 or pool.amount_B == 0: # check pool liquidity
+                    self.fail(order, "امکان سواپ در این استخر به دلیل نبود نقدینگی وجود ندارد")
+                    continue
+                swaping = pool.cal_swaping(order.input_amount, order.is_reverse, fees.total_fee, fees.providers_fee) # reserves in memory include previous orders of this batch
+                if swaping['slippage_tolerance'] > order.max_slippage_tolerance: # check slippage_tolerance
+                    self.fail(order, "سواپ شما به دلیل اختلاف تلرانس بیش از حد مجاز مشخص شده، انجام نشد")
+                    continue
+                input_currency = pool.currency_B if order.is_reverse else pool.currency_A
+                output_currency = pool.currency_A if order.is_reverse else pool.currency_B
+                input_wallet = Wallet.objects.find_by_currency_symbol_and_merge_to_last(order.user, input_currency.symbol)
+                output_wallet = Wallet.objects.find_by_currency_symbol_and_merge_to_last(order.user, output_currency.symbol)
+                if not input_wallet.check_available_balance(order.input_amount): # check user balance
+                    self.fail(order, f"موجودی {input_currency.name_fa} شما کافی نمیباشد")
+                    continue
+
+                input_wallet.low_balance(order.input_amount)
+                output_wallet.add_balance(swaping['output_amount'], add_net=False)
+                pool.amount_A = swaping['final_amount_A']
+                pool.amount_B = swaping['final_amount_B']
+                order.swap = SwapHistory.objects.build_new_swap(
+                    user=order.user,
+                    pool=pool,
+                    input_currency=input_currency,
+                    output_currency=output_currency,
+                    input_amount=order.input_amount,
+                    output_amount=swaping['output_amount'],
+                    fee_amount=swaping['fee_amount'],
+                    before_price=before_price,
+                    after_price=swaping['final_price'],
+                    slippage_tolerance=swaping['slippage_tolerance'],
+                    price_snapshot=price_snapshot,
+                    fee_percentage=fees.total_fee
+                )
+                order.status = 'done'
+                swaps.append(order.swap)
+
+            if swaps:
+                pool.save(update_fields=['amount_A', 'amount_B']) # one write for all swaps of this batch
+                SwapHistory.objects.bulk_create_new_swaps(swaps, price_snapshot=price_snapshot) # ids of swaps are set here
+                for order in orders:
+                    if order.swap is not None:
+                        order.swap_id = order.swap.id
+            SwapOrder.objects.bulk_update(orders, ['status', 'message', 'swap'])
+        return orders
+
+
+class SwapBatch:
+    """
+    batch swaping of a user: swaps are executed in order in one transaction, pools are locked once (in order of id) and wallet of every currency is fetched once
+    reserves of every pool are updated in memory and written once, swap histories are saved with one bulk insert
+    in 'atomic' mode first failed swap rolls back all swaps, in 'skip' mode failed swaps are skipped and other swaps are committed
+    """
+    modes = ('atomic', 'skip')
+
+    def __init__(self, user, price_snapshot=None, fees=None):
+        """
+        :params price_snapshot: PriceSnapshot object that we find pools from it
+        :params fees: FeeConfig object that all swaps of this batch use it (default is current fees)
+        """
+        self.user = user
+        self.fees = FeeConfig.current() if fees is None else fees
+        self.price_snapshot = PriceSnapshot() if price_snapshot is None else price_snapshot
+        self.wallets = {} # {currency_symbol: wallet of user}
+
+    def find_pool(self, input_currency_symbol, output_currency_symbol):
+        """
+        :return: (pool, is_reverse) of direct pool of these currencies from price snapshot, (None, None) if there is no pool
+        """
+        pools_id = self.price_snapshot.graph.get(input_currency_symbol, {}).get(output_currency_symbol)
+        if not pools_id:
+            return None, None
+        pool = self.price_snapshot.pools[pools_id[0]]
+        return pool, pool.currency_A.symbol != input_currency_symbol
+
+    def get_wallet(self, currency_symbol):
+        if currency_symbol not in self.wallets:
+            self.wallets[currency_symbol] = Wallet.objects.find_by_currency_symbol_and_merge_to_last(self.user, currency_symbol)
+        return self.wallets[currency_symbol]
+
+    def swap(self, pool, is_reverse, item):
+        """
+        apply this swap on reserves of pool (in memory) and wallets of user
+        :return: (SwapHistory object (not saved), None) or (None, error message)
+        """
+        if pool.suspend_swap is True:
+            return None, "تا اطلاع ثانوی سواپ در این استخر غیرفعال می باشد"
+        before_price = pool.cal_price(is_reverse=is_reverse)
+        if before_price <= 0 or pool.amount_A == 0 or pool.amount_B == 0: # check pool liquidity
+            return None, "امکان سواپ در این استخر به دلیل نبود نقدینگی وجود ندارد"
+        swaping = pool.cal_swaping(item['input_amount'], is_reverse, self.fees.total_fee, self.fees.providers_fee) # reserves in memory include previous swaps of this batch
+        if swaping['slippage_tolerance'] > item['max_slippage_tolerance']: # check slippage_tolerance
+            return None, "سواپ شما به دلیل اختلاف تلرانس بیش از حد مجاز مشخص شده، انجام نشد"
+        input_currency = pool.currency_B if is_reverse else pool.currency_A
+        output_currency = pool.currency_A if is_reverse else pool.currency_B
+        input_wallet = self.get_wallet(input_currency.symbol)
+        output_wallet = self.get_wallet(output_currency.symbol)
+        if not input_wallet.check_available_balance(item['input_amount']): # check user balance
+            return None, f"موجودی {input_currency.name_fa} شما کافی نمیباشد"
+
+        input_wallet.low_balance(item['input_amount'])
+        output_wallet.add_balance(swaping['output_amount'], add_net=False)
+        pool.amount_A = swaping['final_amount_A']
+        pool.amount_B = swaping['final_amount_B']
+        return SwapHistory.objects.build_new_swap(
+            user=self.user,
+            pool=pool,
+            input_currency=input_currency,
+            output_currency=output_currency,
+            input_amount=item['input_amount'],
+            output_amount=swaping['output_amount'],
+            fee_amount=swaping['fee_amount'],
+            before_price=before_price,
+            after_price=swaping['final_price'],
+            slippage_tolerance=swaping['slippage_tolerance'],
+            price_snapshot=self.price_snapshot,
+            fee_percentage=self.fees.total_fee
+        ), None
+
+    @timed('swap.batch')
+    def execute(self, items, mode='atomic'):
+        """
+        :params items: list of swaps, {'input_currency_symbol', 'output_currency_symbol', 'input_amount', 'max_slippage_tolerance'}
+        :params mode: 'atomic' or 'skip'
+        :return: result of every item in order, {'index', 'status', 'message', 'swap': SwapHistory object or None}
+        """
+        results = []
+        routes = []
+        for item in items:
+            pool, is_reverse = self.find_pool(item['input_currency_symbol'], item['output_currency_symbol'])
+            routes.append((pool, is_reverse))
+        with transaction.atomic():
+            pools_id = sorted({pool.id for pool, is_reverse in routes if pool is not None})
+            pools = {pool.id: pool for pool in Pool.objects.select_for_update(of=('self',)).select_related('currency_A', 'currency_B').filter(id__in=pools_id).order_by('id')} # lock all pools of batch once (only pool rows, not their currencies)
+            changed_pools = {}
+            swaps = []
+            for index, item in enumerate(items):
+                pool, is_reverse = routes[index]
+                if pool is None:
+                    swap, message = None, "استخر یافت نشد"
+                else:
+                    pool = pools[pool.id]
+                    swap, message = self.swap(pool, is_reverse, item)
+                results.append({'index': index, 'status': swap is not None, 'message': message, 'swap': swap})
+                if swap is None:
+                    if mode == 'atomic': # all swaps of batch are rolled back
+                        transaction.set_rollback(True)
+                        break
+                    continue
+                changed_pools[pool.id] = pool
+                swaps.append(swap)
+
+            if mode == 'atomic' and len(swaps) != len(items):
+                for result in results:
+                    if result['status']:
+                        result.update(status=False, message="به دلیل انجام نشدن سواپ دیگری از این دسته، این سواپ انجام نشد", swap=None)
+                results += [{'index': index, 'status': False, 'message': "به دلیل انجام نشدن سواپ دیگری از این دسته، این سواپ انجام نشد", 'swap': None} for index in range(len(results), len(items))]
+                return results
+
+            for pool in changed_pools.values():
+                pool.save(update_fields=['amount_A', 'amount_B']) # one write per pool for all swaps of batch
+            if swaps:
+                SwapHistory.objects.bulk_create_new_swaps(swaps, price_snapshot=self.price_snapshot)
+        return results
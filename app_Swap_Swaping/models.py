@@ -1,113 +1,514 @@
-from django.db import models
-from django.utils import timezone
-
-from app_Admin_Option.models import Option
-from app_User.models import User
-from app_Swap_Pool.models import Pool
-from app_Currency.models import Currency
-
-
-class SwapHistoryManager(models.Manager):
-    def find_by_id(self, id):
-        return self.filter(id=id).first()
-
-    def find_by_pool(self, pool):
-        """
-        find all swaps of this pool
-        """
-        return self.filter(pool=pool)
-    
-    def find_by_user_pool_last(self, user=None, pool=None):
-        """
-        find all swaps of this user in this pool and order_by last to first
-        """
-        if user:
-            return self.filter(user=user, pool=pool).order_by('-time') if pool else self.filter(user=user).order_by('-time')
-        else:
-            return self.filter(pool=pool).order_by('-time') if pool else self.all().order_by('-time')
-
-    def find_by_pool_time(self, start_date, end_date, pool=None):
-        """
-        find all swaps in certain time range [start_date, end_date] in this pool
-        """
-        return self.filter(pool=pool, time__range=(start_date, end_date)).order_by('-time') if pool else self.filter(time__range=(start_date, end_date)).order_by('-time')
-
-    def cal_total_received_fees(self, pool, base_currency=None):
-        """
-        calculating total received fees based on base_currency in this pool
-        """
-        swap_query = self.find_by_pool(pool=pool) # all swaps of this pool
-        fees = {'currency_A': 0, 'currency_B': 0, 'total_value': 0}
-        for swap in swap_query:
-            if swap.input_currency.symbol.upper() == swap.pool.currency_A.symbol.upper(): # fee that we received, is in currency_B
-                fees['currency_B'] += swap.fee_amount
-            else: # fee that we received, is in currency_A
-                fees['currency_A'] += swap.fee_amount
-        if base_currency is None: # return total value based on currency_B
-            fees['total_value'] = fees['currency_B'] + fees['currency_A'] * pool.cal_price()
-        elif base_currency == 'IRT' or base_currency == 'USDT' or base_currency == 'BTC': # return total value based on base_currency
-            currency_A_value = fees['currency_A'] * Pool.objects.cal_price(currency_symbol=pool.currency_A.symbol.upper(), base_currency_symbol=base_currency)
-            currency_B_value = fees['currency_B'] * Pool.objects.cal_price(currency_symbol=pool.currency_B.symbol.upper(), base_currency_symbol=base_currency)
-            fees['total_value'] = currency_A_value + currency_B_value
-        return fees
-
-    def cal_total_received_fees_currency_in_all_pools(self, currency_symbol, base_currency=None):
-        """
-        calculating total received fees of this currency_symbol based on base_currency in all pools
-        """
-        pools = Pool.objects.filter_by_currency(currency_symbol) # all pools with this currency_symbol
-        fees={'amount': 0, 'value': 0}
-        for pool in pools:
-            swap_query = self.find_by_pool(pool=pool) # all swaps of this pool
-            for swap in swap_query:
-                if swap.output_currency.symbol.upper() == currency_symbol.upper():
-                    fees['amount'] += swap.fee_amount
-        if base_currency is None: # return total value based on currency_symbol
-            fees['value'] = fees['amount']
-        elif base_currency == 'IRT' or base_currency == 'USDT' or base_currency == 'BTC': # return total value based on base_currency
-            fees['value'] = fees['amount'] * Pool.objects.cal_price(currency_symbol.upper(), base_currency_symbol=base_currency)
-        return fees
-
-    def create_new_swap(self, user, pool, input_currency, output_currency, input_amount, output_amount, fee_amount, before_price, after_price, slippage_tolerance):
-        """
-        create new swap transaction history
-        """
-        fee_total_option = Option.objects.find_by_code_name('swap_fee')
-        return self.create(
-            user=user,
-            pool=pool,
-            input_currency=input_currency,
-            output_currency=output_currency,
-            input_amount=input_amount,
-            output_amount=output_amount,
-            fee_amount=fee_amount,
-            fee_percentage=float(fee_total_option.value),
-            fee_value_irt=fee_amount * Pool.objects.cal_price(output_currency.symbol, 'IRT'),
-            before_price=before_price,
-            after_price=after_price,
-            slippage_tolerance=slippage_tolerance,
-            equivalent_irt=output_amount * Pool.objects.cal_price(currency_symbol=output_currency.symbol, base_currency_symbol='IRT'),
-            equivalent_usdt=output_amount * Pool.objects.cal_price(currency_symbol=output_currency.symbol, base_currency_symbol='USDT'),
-            equivalent_btc=output_amount * Pool.objects.cal_price(currency_symbol=output_currency.symbol, base_currency_symbol='BTC'),
-        )
-
-
-class SwapHistory(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE, default=True, related_name='SwapHistory_User')
-    pool = models.ForeignKey(Pool, on_delete=models.CASCADE, default=True, related_name='SwapHistory_Pool')
-    input_currency = models.ForeignKey(Currency, on_delete=models.CASCADE, default=True, related_name='SwapHistory_input_currency')
-    output_currency = models.ForeignKey(Currency, on_delete=models.CASCADE, default=True, related_name='SwapHistory_output_currency')
-    input_amount = models.FloatField(null=True, blank=True, default=0)
-    output_amount = models.FloatField(null=True, blank=True, default=0)
-    fee_amount = models.FloatField(null=True, blank=True, default=0)
-    fee_percentage = models.FloatField(null=True, blank=True, default=0)
-    fee_value_irt = models.FloatField(null=True, blank=True, default=0)
-    before_price = models.FloatField(null=True, blank=True, default=0)
-    after_price = models.FloatField(null=True, blank=True, default=0)
-    slippage_tolerance = models.FloatField(null=True, blank=True, default=0)
-    equivalent_irt = models.FloatField(null=True, blank=True, default=0)
-    equivalent_usdt = models.FloatField(null=True, blank=True, default=0)
-    equivalent_btc = models.FloatField(null=True, blank=True, default=0)
-    time = models.DateTimeField(default=timezone.now)
-    
-    objects = SwapHistoryManager()
+from django.db import models, transaction, connection, IntegrityError
+from django.db.models import Q, F, Sum, Count
+from django.db.models.functions import Greatest, Least, TruncHour
+from django.utils import timezone
+from datetime import timedelta
+import pytz
+
+from app_User.models import User
+from app_Swap_Pool.models import Pool
+from app_Currency.models import Currency
+from app_Swap_Pool.metrics import timed
+
+
+class SwapHistoryManager(models.Manager):
+    def find_by_id(self, id):
+        return self.filter(id=id).first()
+
+    def find_by_pool(self, pool):
+        """
+        find all swaps of this pool
+        """
+        return self.filter(pool=pool)
+    
+    def find_by_user_pool_last(self, user=None, pool=None):
+        """
+        find all swaps of this user in this pool and order_by last to first
+        """
+        if user:
+            return self.filter(user=user, pool=pool).order_by('-time') if pool else self.filter(user=user).order_by('-time')
+        else:
+            return self.filter(pool=pool).order_by('-time') if pool else self.all().order_by('-time')
+
+    def find_by_pool_time(self, start_date, end_date, pool=None):
+        """
+        find all swaps in certain time range [start_date, end_date] in this pool
+        """
+        return self.filter(pool=pool, time__range=(start_date, end_date)).order_by('-time') if pool else self.filter(time__range=(start_date, end_date)).order_by('-time')
+
+    def sum_received_fees_by_pool(self, pools=None):
+        """
+        :params pools: list (or queryset) of pools, if it's None we calculating fees of all pools
+        :return: received fees of every pool with one grouped query on hourly buckets, {pool_id: {'currency_A': fee, 'currency_B': fee}}
+        """
+        buckets = PoolStatsBucket.objects.all() if pools is None else PoolStatsBucket.objects.filter(pool__in=pools)
+        rows = buckets.order_by().values('pool').annotate(currency_A=Sum('fee_A'), currency_B=Sum('fee_B'))
+        return {row['pool']: {'currency_A': row['currency_A'] or 0, 'currency_B': row['currency_B'] or 0} for row in rows}
+
+    def cal_total_received_fees(self, pool, base_currency=None, price_snapshot=None, pools_fees=None):
+        """
+        calculating total received fees based on base_currency in this pool (price_snapshot is PriceSnapshot object for calculating prices)
+        pools_fees is result of sum_received_fees_by_pool, pass it when you are calculating fees of many pools (so we don't query for every pool)
+        """
+        if pools_fees is None:
+            pools_fees = self.sum_received_fees_by_pool(pools=[pool])
+        fees = {'currency_A': 0, 'currency_B': 0, 'total_value': 0}
+        fees.update(pools_fees.get(pool.id, {}))
+        if base_currency is None: # return total value based on currency_B
+            fees['total_value'] = fees['currency_B'] + fees['currency_A'] * pool.cal_price()
+        elif base_currency == 'IRT' or base_currency == 'USDT' or base_currency == 'BTC': # return total value based on base_currency
+            currency_A_value = fees['currency_A'] * Pool.objects.cal_price(currency_symbol=pool.currency_A.symbol.upper(), base_currency_symbol=base_currency, price_snapshot=price_snapshot)
+            currency_B_value = fees['currency_B'] * Pool.objects.cal_price(currency_symbol=pool.currency_B.symbol.upper(), base_currency_symbol=base_currency, price_snapshot=price_snapshot)
+            fees['total_value'] = currency_A_value + currency_B_value
+        return fees
+
+    def cal_total_received_fees_currency_in_all_pools(self, currency_symbol, base_currency=None, price_snapshot=None):
+        """
+        calculating total received fees of this currency_symbol based on base_currency in all pools (price_snapshot is PriceSnapshot object for calculating prices)
+        """
+        fees = PoolStatsBucket.objects.filter(Q(pool__currency_A__symbol=currency_symbol) | Q(pool__currency_B__symbol=currency_symbol)).aggregate(
+            fee_A=Sum('fee_A', filter=Q(pool__currency_A__symbol=currency_symbol)), # fees in currency_A of pools that currency_A is this currency
+            fee_B=Sum('fee_B', filter=Q(pool__currency_B__symbol=currency_symbol)), # fees in currency_B of pools that currency_B is this currency
+        )
+        fees = {'amount': (fees['fee_A'] or 0) + (fees['fee_B'] or 0), 'value': 0}
+        if base_currency is None: # return total value based on currency_symbol
+            fees['value'] = fees['amount']
+        elif base_currency == 'IRT' or base_currency == 'USDT' or base_currency == 'BTC': # return total value based on base_currency
+            fees['value'] = fees['amount'] * Pool.objects.cal_price(currency_symbol.upper(), base_currency_symbol=base_currency, price_snapshot=price_snapshot)
+        return fees
+
+    def build_new_swap(self, user, pool, input_currency, output_currency, input_amount, output_amount, fee_amount, before_price, after_price, slippage_tolerance, price_snapshot=None, fee_percentage=None):
+        """
+        :return: new (unsaved) swap transaction history, for saving many swaps with bulk_create
+        price_snapshot is PriceSnapshot object of this request for calculating equivalent values without querying pools again
+        """
+        if price_snapshot is not None:
+            price_snapshot.update_pool(pool) # reserves of this pool changed in this swap
+        if fee_percentage is None:
+            from app_Swap_Pool.classes import FeeConfig
+            fee_percentage = FeeConfig.current().total_fee
+        return self.model(
+            user=user,
+            pool=pool,
+            input_currency=input_currency,
+            output_currency=output_currency,
+            input_amount=input_amount,
+            output_amount=output_amount,
+            fee_amount=fee_amount,
+            fee_percentage=fee_percentage,
+            fee_value_irt=fee_amount * Pool.objects.cal_price(output_currency.symbol, 'IRT', price_snapshot=price_snapshot),
+            before_price=before_price,
+            after_price=after_price,
+            slippage_tolerance=slippage_tolerance,
+            equivalent_irt=output_amount * Pool.objects.cal_price(currency_symbol=output_currency.symbol, base_currency_symbol='IRT', price_snapshot=price_snapshot),
+            equivalent_usdt=output_amount * Pool.objects.cal_price(currency_symbol=output_currency.symbol, base_currency_symbol='USDT', price_snapshot=price_snapshot),
+            equivalent_btc=output_amount * Pool.objects.cal_price(currency_symbol=output_currency.symbol, base_currency_symbol='BTC', price_snapshot=price_snapshot),
+        )
+
+    @timed('swap_history.insert')
+    def create_new_swap(self, user, pool, input_currency, output_currency, input_amount, output_amount, fee_amount, before_price, after_price, slippage_tolerance, price_snapshot=None, fee_percentage=None):
+        """
+        create new swap transaction history
+        price_snapshot is PriceSnapshot object of this request for calculating equivalent values without querying pools again
+        """
+        swap = self.build_new_swap(user, pool, input_currency, output_currency, input_amount, output_amount, fee_amount, before_price, after_price, slippage_tolerance, price_snapshot=price_snapshot, fee_percentage=fee_percentage)
+        with transaction.atomic(savepoint=False): # swap history and its hourly stats are saved together (no savepoint queries in transaction of swap)
+            swap.save()
+            PoolStatsBucket.objects.add_swap(swap, input_value_irt=input_amount * Pool.objects.cal_price(input_currency.symbol, 'IRT', price_snapshot=price_snapshot))
+            transaction.on_commit(lambda: PoolCandle.objects.add_swaps([swap])) # candles are written after commit, out of pool lock
+        return swap
+
+    @timed('swap_history.bulk_insert')
+    def bulk_create_new_swaps(self, swaps, price_snapshot=None):
+        """
+        save swaps that built with build_new_swap and add them to hourly stats (in this transaction) and candles (after commit), it should be called in a transaction
+        saved swaps always have their id (for linking orders to them), if database doesn't return ids of bulk insert we insert swaps one by one
+        """
+        if connection.features.can_return_rows_from_bulk_insert:
+            swaps = self.bulk_create(swaps)
+        else: # sqlite (on django < 4) and mysql
+            for swap in swaps:
+                swap.save(force_insert=True)
+        PoolStatsBucket.objects.add_swaps(swaps, [swap.input_amount * Pool.objects.cal_price(swap.input_currency.symbol, 'IRT', price_snapshot=price_snapshot) for swap in swaps])
+        transaction.on_commit(lambda: PoolCandle.objects.add_swaps(swaps)) # candles are written after commit, out of pool lock
+        return swaps
+
+
+class SwapHistory(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, default=True, related_name='SwapHistory_User')
+    pool = models.ForeignKey(Pool, on_delete=models.CASCADE, default=True, related_name='SwapHistory_Pool')
+    input_currency = models.ForeignKey(Currency, on_delete=models.CASCADE, default=True, related_name='SwapHistory_input_currency')
+    output_currency = models.ForeignKey(Currency, on_delete=models.CASCADE, default=True, related_name='SwapHistory_output_currency')
+    input_amount = models.FloatField(null=True, blank=True, default=0)
+    output_amount = models.FloatField(null=True, blank=True, default=0)
+    fee_amount = models.FloatField(null=True, blank=True, default=0)
+    fee_percentage = models.FloatField(null=True, blank=True, default=0)
+    fee_value_irt = models.FloatField(null=True, blank=True, default=0)
+    before_price = models.FloatField(null=True, blank=True, default=0)
+    after_price = models.FloatField(null=True, blank=True, default=0)
+    slippage_tolerance = models.FloatField(null=True, blank=True, default=0)
+    equivalent_irt = models.FloatField(null=True, blank=True, default=0)
+    equivalent_usdt = models.FloatField(null=True, blank=True, default=0)
+    equivalent_btc = models.FloatField(null=True, blank=True, default=0)
+    time = models.DateTimeField(default=timezone.now)
+    
+    objects = SwapHistoryManager()
+
+    class Meta:
+        indexes = [ # same as keyset pagination order (time, id) of history lists
+            models.Index(fields=['pool', '-time', '-id'], name='swaphistory_pool_time'),
+            models.Index(fields=['user', '-time', '-id'], name='swaphistory_user_time'),
+            models.Index(fields=['-time', '-id'], name='swaphistory_time'),
+        ]
+
+
+class PoolStatsBucketManager(models.Manager):
+    def floor_hour(self, time):
+        """
+        :return: start of the hour of this time (key of its bucket)
+        """
+        return time.replace(minute=0, second=0, microsecond=0)
+
+    def filter_by_time(self, start_date, end_date=None, pools=None):
+        """
+        :params start_date: buckets of this hour and later
+        :params end_date: buckets before this hour (if it's None, until now)
+        :params pools: list (or queryset) of pools, if it's None we return buckets of all pools
+        :return: hourly buckets in [start_date, end_date) range, range is rounded down to hour
+        """
+        buckets = self.filter(hour__gte=self.floor_hour(start_date))
+        if end_date is not None:
+            buckets = buckets.filter(hour__lt=self.floor_hour(end_date))
+        return buckets if pools is None else buckets.filter(pool__in=pools)
+
+    def add_swap(self, swap, input_value_irt=0):
+        """
+        add this swap to hourly bucket of its pool (bucket is created on first swap of every hour)
+        """
+        return self.add_swaps([swap], [input_value_irt])
+
+    def add_swaps(self, swaps, inputs_value_irt):
+        """
+        add these swaps to hourly buckets of their pools, swaps of same pool and hour are summed and written with one update
+        counters are increased with F expressions in database, so concurrent swaps never lose an update
+        """
+        deltas = {}
+        for swap, input_value_irt in zip(swaps, inputs_value_irt):
+            is_input_A = swap.input_currency_id == swap.pool.currency_A_id # input is currency_A, so output and fee are in currency_B
+            delta = deltas.setdefault((swap.pool_id, self.floor_hour(swap.time)), {'swap_count': 0, 'volume_A': 0, 'volume_B': 0, 'fee_A': 0, 'fee_B': 0, 'volume_irt': 0, 'fee_irt': 0})
+            delta['swap_count'] += 1
+            delta['volume_A' if is_input_A else 'volume_B'] += swap.input_amount
+            delta['fee_B' if is_input_A else 'fee_A'] += swap.fee_amount
+            delta['volume_irt'] += input_value_irt
+            delta['fee_irt'] += swap.fee_value_irt
+        for (pool_id, hour), delta in deltas.items():
+            fields = {field: F(field) + value for field, value in delta.items()}
+            if self.filter(pool_id=pool_id, hour=hour).update(**fields): # bucket of this hour already exists (one query for most swaps)
+                continue
+            try:
+                with transaction.atomic():
+                    self.create(pool_id=pool_id, hour=hour, **delta)
+            except IntegrityError: # another swap created this bucket right now
+                self.filter(pool_id=pool_id, hour=hour).update(**fields)
+
+    def cal_volume_irt_by_pool(self, start_date, end_date=None, pools=None, price_snapshot=None):
+        """
+        :return: input volume of swaps in [start_date, end_date) based on IRT for every pool, {pool_id: volume}
+        volumes are summed per side and valued with current prices (same as valuing every swap with current price)
+        """
+        rows = self.filter_by_time(start_date, end_date, pools).order_by().values('pool', 'pool__currency_A__symbol', 'pool__currency_B__symbol').annotate(
+            sum_volume_A=Sum('volume_A'),
+            sum_volume_B=Sum('volume_B'),
+        )
+        volumes = {}
+        for row in rows:
+            volume_A_irt = row['sum_volume_A'] * Pool.objects.cal_price(row['pool__currency_A__symbol'], 'IRT', price_snapshot=price_snapshot) if row['sum_volume_A'] else 0
+            volume_B_irt = row['sum_volume_B'] * Pool.objects.cal_price(row['pool__currency_B__symbol'], 'IRT', price_snapshot=price_snapshot) if row['sum_volume_B'] else 0
+            volumes[row['pool']] = volume_A_irt + volume_B_irt
+        return volumes
+
+    def cal_volume_irt(self, start_date, end_date=None, pools=None, price_snapshot=None):
+        """
+        :return: input volume of swaps in [start_date, end_date) based on IRT in these pools (all pools if it's None)
+        """
+        return sum(self.cal_volume_irt_by_pool(start_date, end_date, pools, price_snapshot).values())
+
+    def rebuild(self, pool=None, chunk_size=1000):
+        """
+        delete buckets and build them again from swap history (for swaps that saved before this table)
+        every pool is rebuilt in its own transaction and only that pool is locked, so swaps of other pools are not stopped
+        """
+        pools_id = list(Pool.objects.order_by('id').values_list('id', flat=True)) if pool is None else [pool.id]
+        for pool_id in pools_id:
+            self.rebuild_pool(pool_id, chunk_size=chunk_size)
+
+    def rebuild_pool(self, pool_id, chunk_size=1000):
+        """
+        swaps of this pool are summed per hour in database and valued with one price snapshot (same as cal_volume_irt_by_pool)
+        pool is locked until its buckets are written, so no swap is added to a bucket while it's rebuilt
+        """
+        from app_Swap_Pool.classes import PriceSnapshot # avoid circular import
+        is_input_A = Q(input_currency=F('pool__currency_A'))
+        with transaction.atomic():
+            pool = Pool.objects.select_for_update(of=('self',)).select_related('currency_A', 'currency_B').filter(id=pool_id).first() # lock pool
+            if pool is None:
+                return
+            price_snapshot = PriceSnapshot()
+            self.filter(pool=pool).delete()
+            rows = SwapHistory.objects.filter(pool=pool).annotate(bucket_hour=TruncHour('time', tzinfo=pytz.utc)).order_by().values('bucket_hour').annotate(
+                sum_swap_count=Count('id'),
+                sum_volume_A=Sum('input_amount', filter=is_input_A),
+                sum_volume_B=Sum('input_amount', filter=~is_input_A),
+                sum_fee_A=Sum('fee_amount', filter=~is_input_A), # input is currency_B, so fee is in currency_A
+                sum_fee_B=Sum('fee_amount', filter=is_input_A),
+                sum_fee_irt=Sum('fee_value_irt'),
+            )
+            price_A_irt = Pool.objects.cal_price(pool.currency_A.symbol, 'IRT', price_snapshot=price_snapshot)
+            price_B_irt = Pool.objects.cal_price(pool.currency_B.symbol, 'IRT', price_snapshot=price_snapshot)
+            buckets = []
+            for row in rows.iterator():
+                volume_A, volume_B = row['sum_volume_A'] or 0, row['sum_volume_B'] or 0
+                buckets.append(self.model(
+                    pool=pool,
+                    hour=row['bucket_hour'],
+                    swap_count=row['sum_swap_count'],
+                    volume_A=volume_A,
+                    volume_B=volume_B,
+                    fee_A=row['sum_fee_A'] or 0,
+                    fee_B=row['sum_fee_B'] or 0,
+                    volume_irt=volume_A * price_A_irt + volume_B * price_B_irt,
+                    fee_irt=row['sum_fee_irt'] or 0,
+                ))
+            self.bulk_create(buckets, batch_size=chunk_size)
+
+
+class PoolStatsBucket(models.Model):
+    pool = models.ForeignKey(Pool, on_delete=models.CASCADE, related_name='PoolStatsBucket_Pool')
+    hour = models.DateTimeField(null=False, blank=False)
+    swap_count = models.IntegerField(null=False, blank=False, default=0)
+    volume_A = models.FloatField(null=False, blank=False, default=0.0) # input amount of swaps from currency_A
+    volume_B = models.FloatField(null=False, blank=False, default=0.0) # input amount of swaps from currency_B
+    fee_A = models.FloatField(null=False, blank=False, default=0.0) # received fees in currency_A
+    fee_B = models.FloatField(null=False, blank=False, default=0.0) # received fees in currency_B
+    volume_irt = models.FloatField(null=False, blank=False, default=0.0) # input value of swaps based on IRT (at swap time)
+    fee_irt = models.FloatField(null=False, blank=False, default=0.0) # value of received fees based on IRT (at swap time)
+
+    objects = PoolStatsBucketManager()
+
+    class Meta:
+        unique_together = ('pool', 'hour')
+
+
+class PoolCandleManager(models.Manager):
+    resolutions = {'1m': 60, '5m': 5 * 60, '1h': 60 * 60, '1d': 24 * 60 * 60} # length of every resolution in seconds
+    rollup_resolutions = ('5m', '1h', '1d') # these candles are built from 1m candles by RollupPoolCandles task, swaps only write 1m candles
+    candle_fields = ('pool_id', 'time', 'open', 'high', 'low', 'close', 'volume_A', 'volume_B', 'swap_count')
+
+    def floor_time(self, time, resolution):
+        """
+        :return: start time of the candle of this resolution that this time is in it
+        """
+        if resolution == '1d':
+            return time.replace(hour=0, minute=0, second=0, microsecond=0)
+        if resolution == '1h':
+            return time.replace(minute=0, second=0, microsecond=0)
+        if resolution == '5m':
+            return time.replace(minute=time.minute - time.minute % 5, second=0, microsecond=0)
+        return time.replace(second=0, microsecond=0)
+
+    def cal_swap_prices(self, swap):
+        """
+        :return: before and after price of this swap based on currency_B (price of currency_A), same as pool.cal_price()
+        """
+        if swap.input_currency_id == swap.pool.currency_A_id: # prices of swap are already based on currency_B
+            return swap.before_price, swap.after_price
+        return (1 / swap.before_price if swap.before_price else 0), (1 / swap.after_price if swap.after_price else 0)
+
+    def swap_row(self, swap):
+        """
+        :return: this swap as a candle row (same keys as candle_fields)
+        """
+        before_price, after_price = self.cal_swap_prices(swap)
+        is_input_A = swap.input_currency_id == swap.pool.currency_A_id
+        return {
+            'pool_id': swap.pool_id,
+            'time': swap.time,
+            'open': before_price,
+            'high': max(before_price, after_price),
+            'low': min(before_price, after_price),
+            'close': after_price,
+            'volume_A': swap.input_amount if is_input_A else 0,
+            'volume_B': 0 if is_input_A else swap.input_amount,
+            'swap_count': 1,
+        }
+
+    def merge(self, rows, resolution):
+        """
+        :params rows: candle rows (swap_row of swaps or values of smaller candles) sorted by pool and time
+        :return: generator of not saved candles of this resolution, every candle is merge of rows in its time range
+        """
+        candle = None
+        for row in rows:
+            time = self.floor_time(row['time'], resolution)
+            if candle is None or candle.pool_id != row['pool_id'] or candle.time != time:
+                if candle is not None:
+                    yield candle
+                candle = self.model(pool_id=row['pool_id'], resolution=resolution, time=time, open=row['open'], high=row['high'], low=row['low'], close=row['close'])
+            candle.high = max(candle.high, row['high'])
+            candle.low = min(candle.low, row['low'])
+            candle.close = row['close']
+            candle.volume_A += row['volume_A']
+            candle.volume_B += row['volume_B']
+            candle.swap_count += row['swap_count']
+        if candle is not None:
+            yield candle
+
+    def bulk_create_chunks(self, candles, chunk_size=1000):
+        chunk = []
+        for candle in candles:
+            chunk.append(candle)
+            if len(chunk) >= chunk_size:
+                self.bulk_create(chunk)
+                chunk = []
+        self.bulk_create(chunk)
+
+    def add_swaps(self, swaps):
+        """
+        add these swaps (in time order) to 1m candles, swaps of same candle are merged and written with one update
+        high, low and volumes are updated with database expressions, so concurrent swaps never lose an update
+        it's called after commit of swaps (not in pool lock), a candle is created only if update finds nothing
+        """
+        rows = sorted((self.swap_row(swap) for swap in swaps), key=lambda row: row['pool_id']) # sort is stable, so time order is kept
+        for candle in self.merge(rows, '1m'):
+            fields = {
+                'high': Greatest(F('high'), candle.high),
+                'low': Least(F('low'), candle.low),
+                'close': candle.close,
+                'volume_A': F('volume_A') + candle.volume_A,
+                'volume_B': F('volume_B') + candle.volume_B,
+                'swap_count': F('swap_count') + candle.swap_count,
+            }
+            if self.filter(pool_id=candle.pool_id, resolution='1m', time=candle.time).update(**fields):
+                continue
+            try:
+                with transaction.atomic():
+                    candle.save()
+            except IntegrityError: # another swap created this candle right now
+                self.filter(pool_id=candle.pool_id, resolution='1m', time=candle.time).update(**fields)
+
+    def rollup(self, resolution, start_time=None, pool=None, chunk_size=1000):
+        """
+        build candles of this resolution again from 1m candles
+        :params start_time: only candles from the candle of this time (if it's None, all candles)
+        """
+        rows = self.filter(resolution='1m')
+        candles = self.filter(resolution=resolution)
+        if start_time is not None:
+            rows = rows.filter(time__gte=self.floor_time(start_time, resolution))
+            candles = candles.filter(time__gte=self.floor_time(start_time, resolution))
+        if pool is not None:
+            rows = rows.filter(pool=pool)
+            candles = candles.filter(pool=pool)
+        rows = rows.order_by('pool_id', 'time').values(*self.candle_fields)
+        with transaction.atomic():
+            candles.delete()
+            self.bulk_create_chunks(self.merge(rows.iterator(), resolution), chunk_size)
+
+    def rollup_recent(self):
+        """
+        build current and previous candle of every rollup resolution again (periodic task)
+        """
+        now = timezone.now()
+        for resolution in self.rollup_resolutions:
+            self.rollup(resolution, start_time=now - timedelta(seconds=self.resolutions[resolution]))
+
+    def find_by_pool_resolution(self, pool, resolution, limit, end_time=None):
+        """
+        :params limit: maximum number of candles
+        :params end_time: candles before this time (if it's None, until now)
+        :return: last candles of this pool in this resolution, from old to new
+        current candle of rollup resolutions is merged from 1m candles on read, so it's not behind the rollup task
+        """
+        candles = self.filter(pool=pool, resolution=resolution)
+        if end_time is not None:
+            candles = candles.filter(time__lt=end_time)
+        candles = list(candles.order_by('-time')[:limit])[::-1]
+        if resolution in self.rollup_resolutions and end_time is None:
+            start_time = self.floor_time(timezone.now(), resolution)
+            rows = self.filter(pool=pool, resolution='1m', time__gte=start_time).order_by('time').values(*self.candle_fields)
+            current = list(self.merge(rows, resolution))
+            if current:
+                candles = [candle for candle in candles if candle.time < start_time] + current
+                candles = candles[-limit:]
+        return candles
+
+    def rebuild(self, pool=None, chunk_size=1000):
+        """
+        delete candles and build them again from swap history (for swaps that saved before this table)
+        all candles are written in one transaction, so charts never show a half built history
+        """
+        candles = self.all() if pool is None else self.filter(pool=pool)
+        swaps = SwapHistory.objects.select_related('pool').order_by('pool_id', 'time', 'id')
+        swaps = swaps if pool is None else swaps.filter(pool=pool)
+        with transaction.atomic():
+            candles.delete()
+            self.bulk_create_chunks(self.merge((self.swap_row(swap) for swap in swaps.iterator()), '1m'), chunk_size)
+            for resolution in self.rollup_resolutions:
+                self.rollup(resolution, pool=pool, chunk_size=chunk_size)
+
+
+class PoolCandle(models.Model):
+    resolution_choices = [('1m', '1m'), ('5m', '5m'), ('1h', '1h'), ('1d', '1d')]
+    pool = models.ForeignKey(Pool, on_delete=models.CASCADE, related_name='PoolCandle_Pool')
+    resolution = models.CharField(max_length=2, choices=resolution_choices, default='1h')
+    time = models.DateTimeField(null=False, blank=False) # start time of candle
+    open = models.FloatField(null=False, blank=False, default=0.0) # prices are based on currency_B (price of currency_A)
+    high = models.FloatField(null=False, blank=False, default=0.0)
+    low = models.FloatField(null=False, blank=False, default=0.0)
+    close = models.FloatField(null=False, blank=False, default=0.0)
+    volume_A = models.FloatField(null=False, blank=False, default=0.0) # input amount of swaps from currency_A
+    volume_B = models.FloatField(null=False, blank=False, default=0.0) # input amount of swaps from currency_B
+    swap_count = models.IntegerField(null=False, blank=False, default=0)
+
+    objects = PoolCandleManager()
+
+    class Meta:
+        unique_together = ('pool', 'resolution', 'time')
+
+
+class SwapOrderManager(models.Manager):
+    def find_by_id(self, id):
+        return self.filter(id=id).first()
+
+    def find_by_user_id(self, user, id):
+        """
+        :return: swap order of this user with this id
+        """
+        return self.select_related('swap').filter(user=user, id=id).first()
+
+    def find_pending_by_pool(self, pool, limit=None):
+        """
+        :return: pending swap orders of this pool in arrival order (rows are locked, it should be called in a transaction)
+        """
+        orders = self.select_for_update(of=('self',)).select_related('user') # only order rows are locked (not users).filter(pool=pool, status='pending').order_by('id')
+        return orders[:limit] if limit else orders
+
+
+class SwapOrder(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='SwapOrder_User')
+    pool = models.ForeignKey(Pool, on_delete=models.CASCADE, related_name='SwapOrder_Pool')
+    is_reverse = models.BooleanField(default=False, null=False) # if it's True, input is currency_B
+    input_amount = models.FloatField(null=False, blank=False, default=0.0)
+    max_slippage_tolerance = models.FloatField(null=False, blank=False, default=0.0)
+    status_choices = [('pending', 'pending'), ('done', 'done'), ('failed', 'failed')]
+    status = models.CharField(max_length=7, choices=status_choices, default='pending')
+    message = models.CharField(max_length=255, null=True, blank=True)
+    swap = models.ForeignKey(SwapHistory, on_delete=models.SET_NULL, null=True, blank=True, related_name='SwapOrder_SwapHistory')
+    time = models.DateTimeField(default=timezone.now)
+
+    objects = SwapOrderManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['pool', 'status', 'id'], name='swaporder_pool_status'), # pending orders of a pool in arrival order
+        ]
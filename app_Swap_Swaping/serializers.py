@@ -1,199 +1,438 @@
-from rest_framework import serializers, exceptions
-from rest_framework_simplejwt import authentication
-from django.utils.translation import ugettext_lazy as _
-from django.core.validators import MinValueValidator
-import pytz
-
-from khayyam import JalaliDatetime
-from app_Utils.functions import TehranTimezone
-from datetime import datetime
-from app_Swap_Pool.models import Pool
-from app_Swap_Pool.serializers import CurrencySerializer
-from app_Swap_Swaping.models import SwapHistory
-from app_Wallet.models import Wallet
-
-
-class SwapingSerializers(serializers.ModelSerializer):
-    """
-    serilizer for swaping and pre swaping
-    """
-    default_error_messages = {
-        'user_does_not_exists': {
-            "status": False,
-            "message": _("کاربر یافت نشد")
-        },
-        'pool_does_not_exists': {
-            "status": False,
-            "message": _("استخر یافت نشد")
-        },
-        'user_already_in_this_pool': {
-            "status": False,
-            "message": _("کاربر هم اکنون در این استخر میباشد")
-        },
-        'A_value_is_not_equal_to_B_value': {
-            "status": False,
-            "message": _("ارزش دلاری ارز اول با ارزش دلاری ارز دوم برابر نیست")
-        },
-        'remove_percent_cant_be_zero': {
-            "status": False,
-            "message": _("درصد برداشت از استخر نمیتواند صفر باشد")
-        },
-        'pool_is_suspended_for_now': {
-            "status": False,
-            "message": _("تا اطلاع ثانوی سواپ در این استخر غیرفعال می باشد")
-        },
-        'currency_A_symbol_is_required': {
-            "status": False,
-            "message": _("ارسال نماد ارز اول الزامی است")
-        },
-        'currency_B_symbol_is_required': {
-            "status": False,
-            "message": _("ارسال نماد ارز دوم الزامی است")
-        },
-        'pool_is_empty': {
-            "status": False,
-            "message": _("امکان سواپ در این استخر به دلیل نبود نقدینگی وجود ندارد")
-        },
-    }
-    time = serializers.SerializerMethodField('get_time', read_only=True)
-
-    input_currency_symbol = serializers.CharField(required=True, write_only=True, error_messages={
-        'required': 'ارسال نماد ارز آورده الزامی است',
-        'blank': 'فیلد نماد ارز آورده نباید خالی باشد'
-    })
-    output_currency_symbol = serializers.CharField(required=True, write_only=True, error_messages={
-        'required': 'ارسال نماد ارز دریافتی الزامی است',
-        'blank': 'فیلد نماد ارز دریافتی نباید خالی باشد'
-    })
-    input_amount = serializers.FloatField(required=True, write_only=False, error_messages={
-        'required': 'ارسال مقدار ارز آورده الزامی است',
-        'blank': 'فیلد مقدار ارز آورده نباید خالی باشد'
-    }, validators=[MinValueValidator(0.0)])
-    max_slippage_tolerance = serializers.FloatField(write_only=True, required=True, error_messages={
-        'required': 'ارسال درصد تلرانس الزامی است',
-        'blank': 'فیلد درصد تلرانس نباید خالی باشد'
-    }, validators=[MinValueValidator(0.0)])
-
-    input_currency = CurrencySerializer(many=False, read_only=True)
-    output_currency = CurrencySerializer(many=False, read_only=True)
-
-    class Meta:
-        model = SwapHistory
-        fields = (
-            'input_currency',
-            'output_currency',
-            'output_amount',
-            'fee_amount',
-            'fee_percentage',
-            'before_price',
-            'after_price',
-            'slippage_tolerance',
-            'equivalent_irt',
-            'equivalent_usdt',
-            'equivalent_btc',
-            'time',
-
-            'input_amount',
-            'input_currency_symbol',
-            'output_currency_symbol',
-            'max_slippage_tolerance'
-        )
-
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        request = self.context.get('request')
-
-        self.fields['max_slippage_tolerance'].required = False if request.method == "GET" else True
-
-    def get_time(self, obj): 
-        """
-        time in jalali and calculating diffrence_time between now and swap
-        """
-        user_history_jalali_time = JalaliDatetime(datetime.strptime(str(obj.time), '%Y-%m-%d %H:%M:%S.%f%z').astimezone(tz=TehranTimezone())).isoformat().split("T")
-        user_history_time = user_history_jalali_time[1].split(".")[0].split(":")
-        diffrence_time = datetime.now(tz=pytz.utc) - obj.time
-        return [user_history_jalali_time[0], f"{user_history_time[0]}:{user_history_time[1]}", divmod(diffrence_time.total_seconds(), 60)[0]]
-    
-    def validate(self, attrs):
-        self.user = None
-        request = self.context["request"]
-        if request and hasattr(request, "user"):
-            self.user = authentication.JWTAuthentication().authenticate(request)[0]
-        if self.user is None:
-            raise exceptions.ParseError(
-                self.error_messages['user_does_not_exists'], 'user_does_not_exists'
-            )
-
-        returned_list = Pool.objects.find_by_currencies_symbol(attrs['input_currency_symbol'], attrs['output_currency_symbol'], is_reverse=True) # find all pools with this input_currency_symbol and output_currency_symbol
-        self.pool = returned_list[0]
-        self.is_reverse = returned_list[1]
-        if self.pool is None:
-            raise exceptions.ParseError(
-                self.error_messages['pool_does_not_exists'], 'pool_does_not_exists'
-            )
-
-        if request.method == 'GET':
-            pre_swaping = self.pool.swaping(input_amount=attrs['input_amount'], is_reverse=self.is_reverse, update_pool=False) # pre swaping
-            input_wallet = Wallet.objects.find_by_currency_symbol_and_merge_to_last(self.user, attrs['input_currency_symbol'])
-            return {
-                'balance': input_wallet.available, # current balance
-                'balance_in_irt': input_wallet.available * Pool.objects.cal_price(input_wallet.excurrency.currency.symbol, base_currency_symbol='IRT'), # currenct balance in IRT
-                'before_price': self.pool.cal_price(is_reverse=self.is_reverse), # price before this swap
-                'after_price': pre_swaping['final_price'], # price after this swap
-                'output_amount': pre_swaping['output_amount'], # received amount of output currency
-                'fee_amount': pre_swaping['fee_amount'], # amount of fee that user should pay in this swap
-                'slippage_tolerance': pre_swaping['slippage_tolerance'], # slippage_tolerance of this swap
-            }
-
-        return attrs
-
-    def create(self, validated_data):
-        if self.pool.suspend_swap is True:
-            raise exceptions.ParseError(
-                self.error_messages['pool_is_suspended_for_now'], 'pool_is_suspended_for_now'
-            )
-        pool_price = self.pool.cal_price(is_reverse=self.is_reverse)
-        if (pool_price == -1) or (self.pool.amount_A==0 and self.pool.amount_B==0): # check pool liquidity
-            raise exceptions.ParseError(
-                self.error_messages['pool_is_empty'], 'pool_is_empty'
-            )
-
-        pre_swaping = self.pool.swaping(input_amount=validated_data['input_amount'], is_reverse=self.is_reverse, update_pool=False) # pre swaping for calcculating slippage_tolerance
-        if pre_swaping['slippage_tolerance'] > validated_data['max_slippage_tolerance']: # check slippage_tolerance
-            raise exceptions.ParseError({
-                "status": False,
-                "message": _(f"سواپ شما به دلیل اختلاف تلرانس بیش از حد مجاز مشخص شده، انجام نشد"),
-                "result": {
-                    "max_slippage_tolerance": validated_data['max_slippage_tolerance'],
-                    "slippage_tolerance": pre_swaping['slippage_tolerance']
-                }
-            })
-
-        input_wallet = Wallet.objects.find_by_currency_symbol_and_merge_to_last(self.user, validated_data['input_currency_symbol'])
-        output_wallet = Wallet.objects.find_by_currency_symbol_and_merge_to_last(self.user, validated_data['output_currency_symbol'])
-        if not input_wallet.check_available_balance(validated_data['input_amount']): # check user balance
-            raise exceptions.ParseError({
-                "status": False,
-                "message": _(f"موجودی {input_wallet.excurrency.currency.name_fa} شما کافی نمیباشد")
-            })
-
-        input_wallet.low_balance(validated_data['input_amount']) # low user input_wallet balance
-        swaping = self.pool.swaping(input_amount=validated_data['input_amount'], is_reverse=self.is_reverse, update_pool=True) # doing swap
-        output_wallet.add_balance(swaping['output_amount'], add_net=False) # add output_amount in output_wallet
-
-        swap = SwapHistory.objects.create_new_swap(
-            user=self.user,
-            pool=self.pool,
-            input_currency=input_wallet.excurrency.currency,
-            output_currency=output_wallet.excurrency.currency,
-            input_amount=validated_data['input_amount'],
-            output_amount=swaping['output_amount'],
-            fee_amount=swaping['fee_amount'],
-            before_price=pool_price,
-            after_price=swaping['final_price'],
-            slippage_tolerance=swaping['slippage_tolerance']
-        )
-
-        swap_ser = SwapingSerializers(swap, many=False, context={"request": self.context.get('request')}).data
-
-        return swap_ser
+from rest_framework import serializers, exceptions
+from rest_framework_simplejwt import authentication
+from django.utils.translation import ugettext_lazy as _
+from django.core.validators import MinValueValidator
+from django.db import transaction
+import pytz
+
+from khayyam import JalaliDatetime
+from app_Utils.functions import TehranTimezone
+from datetime import datetime
+from app_Swap_Pool.models import Pool
+from app_Swap_Pool.serializers import CurrencySerializer
+from app_Swap_Pool.metrics import Metrics, timed
+from app_Swap_Swaping.models import SwapHistory
+from app_Swap_Swaping.classes import SwapRouter, SwapSequencer, SwapBatch
+from django.conf import settings
+from app_Wallet.models import Wallet
+
+
+class SwapingSerializers(serializers.ModelSerializer):
+    """
+    serilizer for swaping and pre swaping
+    """
+    default_error_messages = {
+        'user_does_not_exists': {
+            "status": False,
+            "message": _("کاربر یافت نشد")
+        },
+        'pool_does_not_exists': {
+            "status": False,
+            "message": _("استخر یافت نشد")
+        },
+        'user_already_in_this_pool': {
+            "status": False,
+            "message": _("کاربر هم اکنون در این استخر میباشد")
+        },
+        'A_value_is_not_equal_to_B_value': {
+            "status": False,
+            "message": _("ارزش دلاری ارز اول با ارزش دلاری ارز دوم برابر نیست")
+        },
+        'remove_percent_cant_be_zero': {
+            "status": False,
+            "message": _("درصد برداشت از استخر نمیتواند صفر باشد")
+        },
+        'pool_is_suspended_for_now': {
+            "status": False,
+            "message": _("تا اطلاع ثانوی سواپ در این استخر غیرفعال می باشد")
+        },
+        'currency_A_symbol_is_required': {
+            "status": False,
+            "message": _("ارسال نماد ارز اول الزامی است")
+        },
+        'currency_B_symbol_is_required': {
+            "status": False,
+            "message": _("ارسال نماد ارز دوم الزامی است")
+        },
+        'pool_is_empty': {
+            "status": False,
+            "message": _("امکان سواپ در این استخر به دلیل نبود نقدینگی وجود ندارد")
+        },
+    }
+    time = serializers.SerializerMethodField('get_time', read_only=True)
+
+    input_currency_symbol = serializers.CharField(required=True, write_only=True, error_messages={
+        'required': 'ارسال نماد ارز آورده الزامی است',
+        'blank': 'فیلد نماد ارز آورده نباید خالی باشد'
+    })
+    output_currency_symbol = serializers.CharField(required=True, write_only=True, error_messages={
+        'required': 'ارسال نماد ارز دریافتی الزامی است',
+        'blank': 'فیلد نماد ارز دریافتی نباید خالی باشد'
+    })
+    input_amount = serializers.FloatField(required=True, write_only=False, error_messages={
+        'required': 'ارسال مقدار ارز آورده الزامی است',
+        'blank': 'فیلد مقدار ارز آورده نباید خالی باشد'
+    }, validators=[MinValueValidator(0.0)])
+    max_slippage_tolerance = serializers.FloatField(write_only=True, required=True, error_messages={
+        'required': 'ارسال درصد تلرانس الزامی است',
+        'blank': 'فیلد درصد تلرانس نباید خالی باشد'
+    }, validators=[MinValueValidator(0.0)])
+
+    input_currency = CurrencySerializer(source='input_currency_id', many=False, read_only=True) # served from CurrencyCache without fetching currency
+    output_currency = CurrencySerializer(source='output_currency_id', many=False, read_only=True)
+
+    class Meta:
+        model = SwapHistory
+        fields = (
+            'input_currency',
+            'output_currency',
+            'output_amount',
+            'fee_amount',
+            'fee_percentage',
+            'before_price',
+            'after_price',
+            'slippage_tolerance',
+            'equivalent_irt',
+            'equivalent_usdt',
+            'equivalent_btc',
+            'time',
+
+            'input_amount',
+            'input_currency_symbol',
+            'output_currency_symbol',
+            'max_slippage_tolerance'
+        )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+
+        self.fields['max_slippage_tolerance'].required = False if request.method == "GET" else True
+
+    def get_time(self, obj): 
+        """
+        time in jalali and calculating diffrence_time between now and swap
+        """
+        user_history_jalali_time = JalaliDatetime(datetime.strptime(str(obj.time), '%Y-%m-%d %H:%M:%S.%f%z').astimezone(tz=TehranTimezone())).isoformat().split("T")
+        user_history_time = user_history_jalali_time[1].split(".")[0].split(":")
+        diffrence_time = datetime.now(tz=pytz.utc) - obj.time
+        return [user_history_jalali_time[0], f"{user_history_time[0]}:{user_history_time[1]}", divmod(diffrence_time.total_seconds(), 60)[0]]
+    
+    @timed('swap.validate')
+    def validate(self, attrs):
+        self.user = None
+        request = self.context["request"]
+        if request and hasattr(request, "user"):
+            with Metrics.span('swap.authenticate'): # user is authenticated again in serializer
+                self.user = authentication.JWTAuthentication().authenticate(request)[0]
+        if self.user is None:
+            raise exceptions.ParseError(
+                self.error_messages['user_does_not_exists'], 'user_does_not_exists'
+            )
+
+        returned_list = Pool.objects.find_by_currencies_symbol(attrs['input_currency_symbol'], attrs['output_currency_symbol'], is_reverse=True) # find all pools with this input_currency_symbol and output_currency_symbol
+        self.pool = returned_list[0]
+        self.is_reverse = returned_list[1]
+        self.route = None
+        if self.pool is None: # there is no direct pool, so we search a route through other pools
+            self.router = SwapRouter(price_snapshot=self.context.get('price_snapshot'))
+            self.route = self.router.find_best_route(attrs['input_currency_symbol'], attrs['output_currency_symbol'], attrs['input_amount'])
+            if self.route is None:
+                raise exceptions.ParseError(
+                    self.error_messages['pool_does_not_exists'], 'pool_does_not_exists'
+                )
+
+        if request.method == 'GET' and self.route is not None: # pre swaping through route
+            input_wallet = Wallet.objects.find_by_currency_symbol_and_merge_to_last(self.user, attrs['input_currency_symbol'])
+            return {
+                'balance': input_wallet.available, # current balance
+                'balance_in_irt': input_wallet.available * Pool.objects.cal_price(input_wallet.excurrency.currency.symbol, base_currency_symbol='IRT', price_snapshot=self.context.get('price_snapshot')), # currenct balance in IRT
+                'before_price': self.route['before_price'], # price before this swap
+                'after_price': self.route['after_price'], # price after this swap
+                'output_amount': self.route['output_amount'], # received amount of output currency
+                'fee_amount': self.cal_route_fee_amount(self.route), # amount of fee that user should pay in this route based on input currency (fee of every pool is in route)
+                'slippage_tolerance': self.route['slippage_tolerance'], # slippage_tolerance of this swap
+                'route': self.serialize_route(self.route), # pools of this route
+            }
+
+        if request.method == 'GET':
+            pre_swaping = self.pool.swaping(input_amount=attrs['input_amount'], is_reverse=self.is_reverse, update_pool=False) # pre swaping
+            input_wallet = Wallet.objects.find_by_currency_symbol_and_merge_to_last(self.user, attrs['input_currency_symbol'])
+            return {
+                'balance': input_wallet.available, # current balance
+                'balance_in_irt': input_wallet.available * Pool.objects.cal_price(input_wallet.excurrency.currency.symbol, base_currency_symbol='IRT', price_snapshot=self.context.get('price_snapshot')), # currenct balance in IRT
+                'before_price': self.pool.cal_price(is_reverse=self.is_reverse), # price before this swap
+                'after_price': pre_swaping['final_price'], # price after this swap
+                'output_amount': pre_swaping['output_amount'], # received amount of output currency
+                'fee_amount': pre_swaping['fee_amount'], # amount of fee that user should pay in this swap
+                'slippage_tolerance': pre_swaping['slippage_tolerance'], # slippage_tolerance of this swap
+            }
+
+        return attrs
+
+    def serialize_route(self, route):
+        """
+        :return: currencies symbol of every leg of this route
+        """
+        return [{
+            'pool_id': leg['pool'].id,
+            'input_currency_symbol': leg['pool'].currency_B.symbol if leg['is_reverse'] else leg['pool'].currency_A.symbol,
+            'output_currency_symbol': leg['pool'].currency_A.symbol if leg['is_reverse'] else leg['pool'].currency_B.symbol,
+            'output_amount': leg['output_amount'],
+            'fee_amount': leg['fee_amount'], # fee of this pool based on output currency of this leg
+        } for leg in route['legs']]
+
+    def cal_route_fee_amount(self, route):
+        """
+        :return: sum of fees of all legs of this route based on input currency of route (every fee is converted with before prices of its previous legs)
+        """
+        fee_amount = 0
+        price = 1 # price of route input currency based on output currency of this leg
+        for leg in route['legs']:
+            price *= leg['before_price']
+            fee_amount += leg['fee_amount'] / price if price > 0 else 0
+        return fee_amount
+
+    @timed('swap.create_by_route')
+    def create_by_route(self, validated_data):
+        """
+        doing all swaps of route atomically, we save one swap history per pool
+        """
+        with transaction.atomic():
+            route = self.router.lock_route(self.route) # lock pools and calculating route again with fresh amounts
+            if any(leg['pool'].suspend_swap for leg in route['legs']):
+                raise exceptions.ParseError(
+                    self.error_messages['pool_is_suspended_for_now'], 'pool_is_suspended_for_now'
+                )
+            if route['slippage_tolerance'] > validated_data['max_slippage_tolerance']: # check slippage_tolerance
+                raise exceptions.ParseError({
+                    "status": False,
+                    "message": _(f"سواپ شما به دلیل اختلاف تلرانس بیش از حد مجاز مشخص شده، انجام نشد"),
+                    "result": {
+                        "max_slippage_tolerance": validated_data['max_slippage_tolerance'],
+                        "slippage_tolerance": route['slippage_tolerance']
+                    }
+                })
+
+            with Metrics.span('swap.wallets'):
+                input_wallet = Wallet.objects.find_by_currency_symbol_and_merge_to_last(self.user, validated_data['input_currency_symbol'])
+                output_wallet = Wallet.objects.find_by_currency_symbol_and_merge_to_last(self.user, validated_data['output_currency_symbol'])
+            if not input_wallet.check_available_balance(validated_data['input_amount']): # check user balance
+                raise exceptions.ParseError({
+                    "status": False,
+                    "message": _(f"موجودی {input_wallet.excurrency.currency.name_fa} شما کافی نمیباشد")
+                })
+
+            input_wallet.low_balance(validated_data['input_amount']) # low user input_wallet balance
+            swaps = self.router.execute(self.user, route) # doing swaps
+            output_wallet.add_balance(route['output_amount'], add_net=False) # add output_amount of last pool in output_wallet
+
+        return {
+            'input_amount': route['input_amount'],
+            'output_amount': route['output_amount'],
+            'before_price': route['before_price'],
+            'after_price': route['after_price'],
+            'slippage_tolerance': route['slippage_tolerance'],
+            'route': SwapingSerializers(swaps, many=True, context={"request": self.context.get('request')}).data
+        }
+
+    @timed('swap.create')
+    def create(self, validated_data):
+        if self.route is not None: # there is no direct pool
+            return self.create_by_route(validated_data)
+        router = SwapRouter(price_snapshot=self.context.get('price_snapshot'))
+        with transaction.atomic(): # locking pool, settlement and swap history are in one transaction
+            route = router.lock([(self.pool, self.is_reverse)]) # lock pool row (and reload its reserves)
+            pool = route[0][0]
+            if pool.suspend_swap is True:
+                raise exceptions.ParseError(
+                    self.error_messages['pool_is_suspended_for_now'], 'pool_is_suspended_for_now'
+                )
+            if (pool.cal_price(is_reverse=self.is_reverse) == -1) or (pool.amount_A==0 and pool.amount_B==0): # check pool liquidity
+                raise exceptions.ParseError(
+                    self.error_messages['pool_is_empty'], 'pool_is_empty'
+                )
+
+            quote = router.quote(route, validated_data['input_amount']) # calculating swap once with locked reserves
+            if quote['slippage_tolerance'] > validated_data['max_slippage_tolerance']: # check slippage_tolerance
+                raise exceptions.ParseError({
+                    "status": False,
+                    "message": _(f"سواپ شما به دلیل اختلاف تلرانس بیش از حد مجاز مشخص شده، انجام نشد"),
+                    "result": {
+                        "max_slippage_tolerance": validated_data['max_slippage_tolerance'],
+                        "slippage_tolerance": quote['slippage_tolerance']
+                    }
+                })
+
+            with Metrics.span('swap.wallets'):
+                input_wallet = Wallet.objects.find_by_currency_symbol_and_merge_to_last(self.user, validated_data['input_currency_symbol'])
+                output_wallet = Wallet.objects.find_by_currency_symbol_and_merge_to_last(self.user, validated_data['output_currency_symbol'])
+            if not input_wallet.check_available_balance(validated_data['input_amount']): # check user balance
+                raise exceptions.ParseError({
+                    "status": False,
+                    "message": _(f"موجودی {input_wallet.excurrency.currency.name_fa} شما کافی نمیباشد")
+                })
+
+            input_wallet.low_balance(validated_data['input_amount']) # low user input_wallet balance
+            swap = router.execute(self.user, quote)[0] # doing swap (only reserves of pool are written) and saving swap history
+            output_wallet.add_balance(quote['output_amount'], add_net=False) # add output_amount in output_wallet
+
+        swap_ser = SwapingSerializers(swap, many=False, context={"request": self.context.get('request')}).data
+
+        return swap_ser
+
+
+class SwapOrderSerializers(SwapingSerializers):
+    """
+    queued swaping, swap order is settled in arrival order with other orders of its pool
+    request never waits for settlement, client reads status of order with its order_id (GET of SwapOrderView)
+    """
+
+    def serialize_order(self, order):
+        """
+        :return: status of this swap order and its swap (if it's done)
+        """
+        return {
+            'order_id': order.id,
+            'status': order.status,
+            'message': order.message,
+            'swap': SwapingSerializers(order.swap, many=False, context={"request": self.context.get('request')}).data if order.swap_id else None
+        }
+
+    def create(self, validated_data):
+        if self.route is not None: # queued swaping is only for direct pools
+            raise exceptions.ParseError(
+                self.error_messages['pool_does_not_exists'], 'pool_does_not_exists'
+            )
+        sequencer = SwapSequencer()
+        order = sequencer.enqueue(self.user, self.pool, self.is_reverse, validated_data['input_amount'], validated_data['max_slippage_tolerance'])
+        return self.serialize_order(order)
+
+
+class SwapingQuoteSerializers(serializers.Serializer):
+    """
+    pre swaping of a list of input amounts (in one pass)
+    """
+    default_error_messages = {
+        'pool_does_not_exists': {
+            "status": False,
+            "message": _("استخر یافت نشد")
+        },
+        'pool_is_empty': {
+            "status": False,
+            "message": _("امکان سواپ در این استخر به دلیل نبود نقدینگی وجود ندارد")
+        },
+    }
+
+    input_currency_symbol = serializers.CharField(required=True, write_only=True, error_messages={
+        'required': 'ارسال نماد ارز آورده الزامی است',
+        'blank': 'فیلد نماد ارز آورده نباید خالی باشد'
+    })
+    output_currency_symbol = serializers.CharField(required=True, write_only=True, error_messages={
+        'required': 'ارسال نماد ارز دریافتی الزامی است',
+        'blank': 'فیلد نماد ارز دریافتی نباید خالی باشد'
+    })
+    input_amounts = serializers.ListField(child=serializers.FloatField(validators=[MinValueValidator(0.0)]), required=True, write_only=True, allow_empty=False, max_length=1000, error_messages={
+        'required': 'ارسال مقادیر ارز آورده الزامی است',
+        'empty': 'فیلد مقادیر ارز آورده نباید خالی باشد',
+        'max_length': 'تعداد مقادیر ارز آورده نباید بیشتر از {max_length} باشد'
+    })
+
+    def validate(self, attrs):
+        returned_list = Pool.objects.find_by_currencies_symbol(attrs['input_currency_symbol'], attrs['output_currency_symbol'], is_reverse=True) # find pool with this input_currency_symbol and output_currency_symbol
+        pool = returned_list[0]
+        is_reverse = returned_list[1]
+        if pool is None:
+            raise exceptions.ParseError(
+                self.error_messages['pool_does_not_exists'], 'pool_does_not_exists'
+            )
+        before_price = pool.cal_price(is_reverse=is_reverse)
+        if (before_price == -1) or (pool.amount_A == 0 and pool.amount_B == 0): # check pool liquidity
+            raise exceptions.ParseError(
+                self.error_messages['pool_is_empty'], 'pool_is_empty'
+            )
+
+        pre_swaping = pool.batch_swaping(input_amounts=attrs['input_amounts'], is_reverse=is_reverse) # pre swaping of all input amounts
+        return {
+            'input_amounts': attrs['input_amounts'],
+            'before_price': before_price, # price before these swaps
+            'after_price': pre_swaping['final_price'], # price after every swap
+            'output_amount': pre_swaping['output_amount'], # received amount of output currency in every swap
+            'fee_amount': pre_swaping['fee_amount'], # amount of fee that user should pay in every swap
+            'slippage_tolerance': pre_swaping['slippage_tolerance'], # slippage_tolerance of every swap
+        }
+
+
+class SwapBatchItemSerializers(serializers.Serializer):
+    """
+    one swap of a batch
+    """
+    input_currency_symbol = serializers.CharField(required=True, error_messages={
+        'required': 'ارسال نماد ارز آورده الزامی است',
+        'blank': 'فیلد نماد ارز آورده نباید خالی باشد'
+    })
+    output_currency_symbol = serializers.CharField(required=True, error_messages={
+        'required': 'ارسال نماد ارز دریافتی الزامی است',
+        'blank': 'فیلد نماد ارز دریافتی نباید خالی باشد'
+    })
+    input_amount = serializers.FloatField(required=True, error_messages={
+        'required': 'ارسال مقدار ارز آورده الزامی است',
+        'blank': 'فیلد مقدار ارز آورده نباید خالی باشد'
+    }, validators=[MinValueValidator(0.0)])
+    max_slippage_tolerance = serializers.FloatField(required=True, error_messages={
+        'required': 'ارسال درصد تلرانس الزامی است',
+        'blank': 'فیلد درصد تلرانس نباید خالی باشد'
+    }, validators=[MinValueValidator(0.0)])
+
+
+class SwapBatchSerializers(serializers.Serializer):
+    """
+    batch swaping, swaps are executed in order in one transaction (mode is 'atomic' or 'skip' for failed swaps)
+    """
+    default_error_messages = {
+        'user_does_not_exists': {
+            "status": False,
+            "message": _("کاربر یافت نشد")
+        },
+        'too_many_swaps': {
+            "status": False,
+            "message": _("تعداد سواپ ها بیش از حد مجاز است")
+        },
+    }
+
+    swaps = SwapBatchItemSerializers(many=True, required=True, allow_empty=False)
+    mode = serializers.ChoiceField(choices=SwapBatch.modes, required=False, default='atomic', error_messages={
+        "invalid_choice": _("نوع اجرای دسته سواپ اشتباه است"),
+    })
+
+    def validate(self, attrs):
+        self.user = None
+        request = self.context["request"]
+        if request and hasattr(request, "user"):
+            with Metrics.span('swap.authenticate'):
+                self.user = authentication.JWTAuthentication().authenticate(request)[0]
+        if self.user is None:
+            raise exceptions.ParseError(
+                self.error_messages['user_does_not_exists'], 'user_does_not_exists'
+            )
+        if len(attrs['swaps']) > getattr(settings, 'SWAP_BATCH_MAX_SIZE', 100):
+            raise exceptions.ParseError(
+                self.error_messages['too_many_swaps'], 'too_many_swaps'
+            )
+        return attrs
+
+    def create(self, validated_data):
+        batch = SwapBatch(self.user, price_snapshot=self.context.get('price_snapshot'))
+        results = batch.execute(validated_data['swaps'], mode=validated_data['mode'])
+        swaps_ser = SwapingSerializers([result['swap'] for result in results if result['swap'] is not None], many=True, context={"request": self.context.get('request')}).data
+        swaps_ser = iter(swaps_ser)
+        return {
+            'mode': validated_data['mode'],
+            'done': sum(1 for result in results if result['status']),
+            'results': [{
+                'index': result['index'],
+                'status': result['status'],
+                'message': result['message'],
+                'swap': next(swaps_ser) if result['swap'] is not None else None,
+            } for result in results]
+        }
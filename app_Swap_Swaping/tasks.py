@@ -0,0 +1,16 @@
+from celery import shared_task
+
+from app_Swap_Swaping.classes import SwapSequencer
+from app_Swap_Swaping.models import PoolCandle
+
+
+@shared_task()
+def SettlePoolSwaps(pool_id):
+    sequencer = SwapSequencer()
+    while sequencer.settle(pool_id): # settle until there is no pending order
+        pass
+
+
+@shared_task()
+def RollupPoolCandles():
+    PoolCandle.objects.rollup_recent() # swaps only write 1m candles, 5m, 1h and 1d candles are built here
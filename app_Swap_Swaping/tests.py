@@ -1,3 +1,60 @@
-from django.test import TestCase
-
-# Create your tests here.
+from unittest import mock
+
+from app_Swap_Pool.tests import QueryBudgetTestCase
+
+
+class SwapViewsQueryBudgetTest(QueryBudgetTestCase):
+    def swap_data(self, input_currency_symbol=None, output_currency_symbol=None):
+        """
+        :return: request data of swaping 0.01 percent of input reserve (currencies of first pool by default)
+        """
+        input_currency_symbol = input_currency_symbol or self.pool.currency_A.symbol
+        output_currency_symbol = output_currency_symbol or self.pool.currency_B.symbol
+        return {'input_currency_symbol': input_currency_symbol, 'output_currency_symbol': output_currency_symbol, 'input_amount': self.pool.amount_A * 0.0001, 'max_slippage_tolerance': 100}
+
+    def test_pre_swaping(self):
+        from app_Swap_Swaping.views import SwapingView
+        data = self.swap_data()
+        del data['max_slippage_tolerance']
+        response = self.request(SwapingView, 'get', data)
+        self.assertEqual(response.status_code, 200)
+
+    def test_swaping(self):
+        from app_Swap_Swaping.views import SwapingView
+        response = self.request(SwapingView, 'post', self.swap_data())
+        self.assertEqual(response.status_code, 201)
+
+    def test_swaping_through_route(self):
+        from app_Swap_Swaping.views import SwapingView
+        output_pool = self.benchmark.pools[2] # C0/IRT, there is no BTC/C0 pool, so swap is routed through IRT
+        response = self.request(SwapingView, 'post', self.swap_data(output_currency_symbol=output_pool.currency_A.symbol))
+        self.assertEqual(response.status_code, 201)
+
+    def test_swap_order(self):
+        from app_Swap_Swaping.views import SwapOrderView
+        with mock.patch('app_Swap_Swaping.tasks.SettlePoolSwaps.apply_async') as apply_async: # no celery broker in tests
+            response = self.request(SwapOrderView, 'post', self.swap_data())
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(apply_async.called)
+        response = self.request(SwapOrderView, 'get', {'order_id': response.data['result']['order_id']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['result']['status'], 'pending')
+
+    def test_swap_batch(self):
+        from app_Swap_Swaping.views import SwapBatchView
+        response = self.request(SwapBatchView, 'post', {'swaps': [self.swap_data(), self.swap_data()], 'mode': 'atomic'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['result']['done'], 2)
+
+    def test_quote(self):
+        from app_Swap_Swaping.views import SwapingQuoteView
+        data = self.swap_data()
+        response = self.request(SwapingQuoteView, 'get', {'input_currency_symbol': data['input_currency_symbol'], 'output_currency_symbol': data['output_currency_symbol'], 'input_amounts': [data['input_amount'], data['input_amount'] * 10]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['result']['output_amount']), 2)
+
+    def test_swap_history(self):
+        from app_Swap_Swaping.views import SwapHistoryView
+        for data in ({'limit': 100}, {'limit': 100, 'pool_id': self.pool.id, 'this_user': 'True'}, {'pagination': 'cursor', 'limit': 100}, {'count': 'estimated', 'limit': 100}):
+            response = self.request(SwapHistoryView, 'get', data)
+            self.assertEqual(response.status_code, 200)
@@ -1,7 +1,10 @@
-from django.urls import path
-from .views import *
-
-urlpatterns = [
-    path('', SwapingView.as_view()),
-    path('History/', SwapHistoryView.as_view()),
-]
+from django.urls import path
+from .views import *
+
+urlpatterns = [
+    path('', SwapingView.as_view()),
+    path('Quote/', SwapingQuoteView.as_view()),
+    path('Order/', SwapOrderView.as_view()),
+    path('Batch/', SwapBatchView.as_view()),
+    path('History/', SwapHistoryView.as_view()),
+]
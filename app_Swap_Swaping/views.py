@@ -1,75 +1,183 @@
-from rest_framework import generics, status, exceptions
-from rest_framework.permissions import IsAuthenticated
-from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
-from rest_framework_simplejwt import authentication
-
-from app_Swap_Pool.models import Pool
-
-
-from .serializers import SwapingSerializers
-from app_Swap_Swaping.models import SwapHistory
-from app_Utils.permissions import IsLevel1, IsTwoFAEnabled, IsTwoFAValidated, CheckTokenExclusivity
-
-
-class SwapingView(generics.CreateAPIView):
-    serializer_class = SwapingSerializers
-    permission_classes = [IsAuthenticated, IsLevel1, IsTwoFAEnabled, IsTwoFAValidated, CheckTokenExclusivity]
-
-    def post(self, request, *args, **kwargs):
-        ser = self.get_serializer(data=self.request.data)
-        if ser.is_valid():
-            ser = ser.save()
-            return Response({
-                "status": True,
-                'message': 'سواپ شما با موفقیت انجام شد',
-                "result": ser
-            }, status=status.HTTP_201_CREATED)
-        else:
-            return Response({
-                "status": False,
-                "message": ser.errors[list(ser.errors)[0]][0]
-            }, status=status.HTTP_400_BAD_REQUEST)
-
-    def get(self, request):
-        ser = self.get_serializer(data=self.request.query_params)
-        if ser.is_valid():
-            return Response({
-                'status': True,
-                'result': ser.validated_data
-            }, status=status.HTTP_200_OK)
-        else:
-            return Response({
-                "status": False,
-                "message": ser.errors[list(ser.errors)[0]][0]
-            }, status=status.HTTP_400_BAD_REQUEST)
-
-
-class SwapHistoryView(generics.ListAPIView, PageNumberPagination):
-    serializer_class = SwapingSerializers
-    permission_classes = [IsAuthenticated, IsLevel1, IsTwoFAEnabled, IsTwoFAValidated, CheckTokenExclusivity]
-    page_size_query_param = 'limit'
-
-    def get(self, request):
-        user = None
-        if request and hasattr(request, "user"):
-            user = authentication.JWTAuthentication().authenticate(request)[0]
-        if user is None:
-            raise exceptions.ParseError({
-                "status": False,
-                "message": "کاربر یافت نشد"
-            })
-        try:
-            pool = Pool.objects.find_by_id(id=int(self.request.query_params['pool_id']))
-            pool = None if not pool else pool
-        except:
-            pool = None
-        try:
-            this_user = user if self.request.query_params['this_user'] == 'True' else None
-        except:
-            this_user = None
-        
-        swap_transactions = SwapHistory.objects.find_by_user_pool_last(user=this_user, pool=pool)
-        swap_transactions = self.paginate_queryset(swap_transactions)
-        ser = self.get_serializer(swap_transactions, many=True)
-        return self.get_paginated_response(ser.data)
+from rest_framework import generics, status, exceptions
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework_simplejwt import authentication
+
+from app_Swap_Pool.models import Pool
+from app_Swap_Pool.classes import HistoryPagination, HistoryRowRenderer, QueryBudgetMixin, PriceSnapshotContextMixin
+
+
+from .serializers import SwapingSerializers, SwapingQuoteSerializers, SwapOrderSerializers, SwapBatchSerializers
+from app_Swap_Swaping.models import SwapHistory, SwapOrder
+from app_Utils.permissions import IsLevel1, IsTwoFAEnabled, IsTwoFAValidated, CheckTokenExclusivity
+
+
+class SwapingView(QueryBudgetMixin, PriceSnapshotContextMixin, generics.CreateAPIView):
+    serializer_class = SwapingSerializers
+    permission_classes = [IsAuthenticated, IsLevel1, IsTwoFAEnabled, IsTwoFAValidated, CheckTokenExclusivity]
+    query_budget = 30 # authentication and permissions (8) + finding pools (3) + lock (1) + wallets (6) + every leg of a 3 pools route: pool, swap and stats bucket (9) and 1m candle after commit (3)
+
+    def post(self, request, *args, **kwargs):
+        ser = self.get_serializer(data=self.request.data)
+        if ser.is_valid():
+            ser = ser.save()
+            return Response({
+                "status": True,
+                'message': 'سواپ شما با موفقیت انجام شد',
+                "result": ser
+            }, status=status.HTTP_201_CREATED)
+        else:
+            return Response({
+                "status": False,
+                "message": ser.errors[list(ser.errors)[0]][0]
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+    def get(self, request):
+        ser = self.get_serializer(data=self.request.query_params)
+        if ser.is_valid():
+            return Response({
+                'status': True,
+                'result': ser.validated_data
+            }, status=status.HTTP_200_OK)
+        else:
+            return Response({
+                "status": False,
+                "message": ser.errors[list(ser.errors)[0]][0]
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+
+class SwapOrderView(QueryBudgetMixin, generics.CreateAPIView):
+    serializer_class = SwapOrderSerializers
+    permission_classes = [IsAuthenticated, IsLevel1, IsTwoFAEnabled, IsTwoFAValidated, CheckTokenExclusivity]
+    query_budget = 20
+
+    def post(self, request, *args, **kwargs):
+        ser = self.get_serializer(data=self.request.data)
+        if ser.is_valid():
+            ser = ser.save()
+            return Response({
+                "status": True,
+                'message': 'سفارش سواپ شما ثبت شد',
+                "result": ser # order is pending, its status is read with GET and order_id
+            }, status=status.HTTP_202_ACCEPTED)
+        else:
+            return Response({
+                "status": False,
+                "message": ser.errors[list(ser.errors)[0]][0]
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+    def get(self, request):
+        user = None
+        if request and hasattr(request, "user"):
+            user = authentication.JWTAuthentication().authenticate(request)[0]
+        if user is None:
+            raise exceptions.ParseError({
+                "status": False,
+                "message": "کاربر یافت نشد"
+            })
+        try:
+            order = SwapOrder.objects.find_by_user_id(user=user, id=int(self.request.query_params['order_id']))
+        except:
+            order = None
+        if order is None:
+            return Response({
+                "status": False,
+                "message": "سفارش سواپ یافت نشد"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'status': True,
+            'result': SwapOrderSerializers(context=self.get_serializer_context()).serialize_order(order)
+        }, status=status.HTTP_200_OK)
+
+
+class SwapBatchView(QueryBudgetMixin, PriceSnapshotContextMixin, generics.CreateAPIView):
+    serializer_class = SwapBatchSerializers
+    permission_classes = [IsAuthenticated, IsLevel1, IsTwoFAEnabled, IsTwoFAValidated, CheckTokenExclusivity]
+    query_budget = None # queries depend on number of swaps and pools of batch
+
+    def post(self, request, *args, **kwargs):
+        ser = self.get_serializer(data=self.request.data)
+        if ser.is_valid():
+            ser = ser.save()
+            return Response({
+                "status": ser['done'] > 0,
+                'message': 'سواپ های شما انجام شد' if ser['done'] == len(ser['results']) else 'بعضی از سواپ های شما انجام نشد' if ser['done'] else 'سواپ های شما انجام نشد',
+                "result": ser
+            }, status=status.HTTP_201_CREATED if ser['done'] else status.HTTP_400_BAD_REQUEST)
+        else:
+            return Response({
+                "status": False,
+                "message": self.first_error(ser.errors)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+    def first_error(self, errors):
+        """
+        :return: first error message (errors of swaps are nested per swap)
+        """
+        if isinstance(errors, str):
+            return errors
+        error = errors[list(errors)[0]] if isinstance(errors, dict) else next(error for error in errors if error)
+        return self.first_error(error)
+
+
+class SwapingQuoteView(QueryBudgetMixin, generics.GenericAPIView):
+    serializer_class = SwapingQuoteSerializers
+    permission_classes = [IsAuthenticated, IsLevel1, IsTwoFAEnabled, IsTwoFAValidated, CheckTokenExclusivity]
+    query_budget = 15
+
+    def get(self, request):
+        ser = self.get_serializer(data=self.request.query_params)
+        if ser.is_valid():
+            return Response({
+                'status': True,
+                'result': ser.validated_data
+            }, status=status.HTTP_200_OK)
+        else:
+            return Response({
+                "status": False,
+                "message": ser.errors[list(ser.errors)[0]][0]
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+    def post(self, request):
+        # same as get, for long lists of input amounts
+        ser = self.get_serializer(data=self.request.data)
+        if ser.is_valid():
+            return Response({
+                'status': True,
+                'result': ser.validated_data
+            }, status=status.HTTP_200_OK)
+        else:
+            return Response({
+                "status": False,
+                "message": ser.errors[list(ser.errors)[0]][0]
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+
+class SwapHistoryView(QueryBudgetMixin, generics.ListAPIView):
+    serializer_class = SwapingSerializers
+    permission_classes = [IsAuthenticated, IsLevel1, IsTwoFAEnabled, IsTwoFAValidated, CheckTokenExclusivity]
+    query_budget = 10
+    pagination_class = HistoryPagination
+
+    def get(self, request):
+        user = None
+        if request and hasattr(request, "user"):
+            user = authentication.JWTAuthentication().authenticate(request)[0]
+        if user is None:
+            raise exceptions.ParseError({
+                "status": False,
+                "message": "کاربر یافت نشد"
+            })
+        try:
+            pool = Pool.objects.find_by_id(id=int(self.request.query_params['pool_id']))
+            pool = None if not pool else pool
+        except:
+            pool = None
+        try:
+            this_user = user if self.request.query_params['this_user'] == 'True' else None
+        except:
+            this_user = None
+        
+        swap_transactions = SwapHistory.objects.find_by_user_pool_last(user=this_user, pool=pool).values(*HistoryRowRenderer.swap_values)
+        swap_transactions = self.paginate_queryset(swap_transactions)
+        return self.get_paginated_response(HistoryRowRenderer(request).render_swaps(swap_transactions))